@@ -3,14 +3,17 @@
 import sys
 import os
 import tempfile
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
-import yt_dlp
+from urllib.parse import urljoin, urlparse
 import mpv
 import shutil
+from crawler import crawl
+from http_cache import cache_from_environment
+from link_extract import links
+from download_queue import DownloadQueue, completed
 
 OUTPUT_DIR = '/tmp/'
+DOWNLOAD_WORKERS = 6
+DOWNLOADS_PER_HOST = 3
 OUTPUT_FILENAME = OUTPUT_DIR + 'get.sh'
 
 # if os.path.isfile(OUTPUT_FILENAME):
@@ -104,32 +107,16 @@ OUTPUT_FILENAME = OUTPUT_DIR + 'get.sh'
 #         print(f"Your answer can only be yes/y/1 or no/n/0. You answered {answer}")
 
 
+# Downloads run in the background while pages are still being crawled
+DOWNLOADS = DownloadQueue(workers=DOWNLOAD_WORKERS, per_host=DOWNLOADS_PER_HOST)
+DOWNLOAD_JOBS = []
+
 def download_video(vURL, filename):
 
     filename = "/home/ben/bikini/grls2/a2znudes/" + filename
 
-    ydl_options = {
-         'outtmpl': filename,
-    }
-
-    ydl = yt_dlp.YoutubeDL(ydl_options)
-
-    try:
-        ydl.download(vURL)
-    except KeyboardInterrupt:
-        return
-    except:
-        print(f"Call to ytdl with {vURL} failed")
-        return
-
-
     print(f"{vURL} will be downloaded")
-
-
-    if os.path.isfile(filename):
-         print(f"{vURL}  successfully downloaded")
-    else:
-        print(f"{VIDEO_PATH} failed to download")
+    DOWNLOAD_JOBS.append(DOWNLOADS.submit(vURL, filename))
 
 
 FQDN = "https://www.aznude.com"
@@ -172,71 +159,49 @@ def switch_cdn(child_href):
     download_video(add_proto, fname)
 
 
-def get_child(HREF):
-    # print(f"{HREF}")
-    # top_of_path = urlparse(HREF).path
-    # chunks=top_of_path.split('/')
-    # print(f"Chunk {chunks[2]}")
-    next_path = FQDN + HREF
-    #print(f"I would fetch {next_path}")
-    page = requests.get(next_path)
-    soup = BeautifulSoup(page.content, "html.parser")
-    for a in soup.find_all('a', href=True):
-        next_href = a['href']
-        if ".mp4" in next_href:
-            print(f"{next_href} is sent")
-            switch_cdn(next_href)
-            # temp_movie = MOVIE_NAME + "/"
-            # print(f"Next {next_href}")
-            # print(f"tempmovie {temp_movie} ")
-            # chunks = next_href.split(temp_movie)
-            # print(f"length of chunks {len(chunks)}")
-            # #print(f"Fetching {chunks[1]}")
-            # chumps = next_href.split('/')
-            # print(f" Length: {len(chunks)} chunks and {len(chumps)} chumps")
-            # actor = chumps[3]
-            # print(f"{actor} actor")
-            # add_proto = "https:" + next_href
-            # if ( len(chunks) == 2 and len(chumps) == 6 ):
-            #     fname = MOVIE_NAME +  "-" + actor + "-" + chunks[1] 
-            # print(add_proto, fname)
-
-            #     download_video(add_proto, fname)
-            # else:
-            #     print(f"Skip downloading for strangely formatted Chunks")
-
-page = requests.get(SEARCH_STRING)
-soup = BeautifulSoup(page.content, "html.parser")
-
-ANYTHING_FOUND = False    
-
-for a in soup.find_all('a', href=True):
-    
-    THIS_HREF = a['href']
-    #print(f"Processing {THIS_HREF} and looking for {MOVIE_NAME}")
-    if MOVIE_NAME in THIS_HREF:
-        if ".html" in THIS_HREF:
-            ANYTHING_FOUND = True
-            get_child(THIS_HREF)
-    if not ANYTHING_FOUND:
-        #print(f"I didn't find anything - looking for anzcdn")
-        if "/azncdn" in THIS_HREF:
-            print(f"Fixup for {THIS_HREF}")
+def parse_search_page(page):
+    """Returns the child pages linked from the movie/celeb page; nothing is downloaded from it directly."""
+    children = []
+    ANYTHING_FOUND = False
+    for THIS_HREF in links(page.content):
+        #print(f"Processing {THIS_HREF} and looking for {MOVIE_NAME}")
+        if MOVIE_NAME in THIS_HREF:
             if ".html" in THIS_HREF:
                 ANYTHING_FOUND = True
-                get_child(THIS_HREF)
-
-            #print(f"This page is is {THIS_HREF}")
-    # if SEARCH_STRING in THIS_HREF:
-    #     THIS_YTDL, VIDEO_NAME, VIDEO_URL = parse_identifier(THIS_HREF)
-    #     VIDEO_PATH = TARGET_DIR + VIDEO_NAME + ".mp4"
-    #     if os.path.isfile(VIDEO_PATH):
-    #         print(f"{VIDEO_PATH} already exists")
-    #     else:
-    #         #print(f"yt-dlp {THIS_URL} -o /tmp/blood/")
-    #         FILE_HANDLE = open(OUTPUT_FILENAME, 'a')
-    #         FILE_HANDLE.write(THIS_YTDL +"\n")
-    #         download_video(VIDEO_URL, VIDEO_NAME, VIDEO_PATH)
+                children.append(urljoin(page.url, THIS_HREF))
+        if not ANYTHING_FOUND:
+            #print(f"I didn't find anything - looking for anzcdn")
+            if "/azncdn" in THIS_HREF:
+                print(f"Fixup for {THIS_HREF}")
+                if ".html" in THIS_HREF:
+                    ANYTHING_FOUND = True
+                    children.append(urljoin(page.url, THIS_HREF))
+    return children, []
+
+def parse_child_page(page):
+    """Returns the .mp4 links on a child page, as written in the page (switch_cdn expects that form)."""
+    return [], [href for href in links(page.content) if ".mp4" in href]
+
+def parse_page(page):
+    if page.depth == 0:
+        return parse_search_page(page)
+    return parse_child_page(page)
+
+def queue_video(next_href):
+    print(f"{next_href} is sent")
+    switch_cdn(next_href)
+
+# Child pages are fetched concurrently, and each video is queued for download as soon as it's found
+# Movie and child pages are cached on disk (see http_cache.py) and only revalidated once stale
+HTTP_CACHE = cache_from_environment()
+videos = crawl([SEARCH_STRING], parse_page, max_depth=1, on_found=queue_video, cache=HTTP_CACHE)
+if HTTP_CACHE is not None:
+    HTTP_CACHE.close()
+print(f"Found {len(videos)} videos")
+for result in completed(DOWNLOAD_JOBS):
+    if result.error:
+        print(f"Call to ytdl with {result.url} failed: {result.error}")
+DOWNLOADS.close()
 
 try:
     FILE_HANDLE.close()
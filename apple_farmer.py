@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 import sys
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import yt_dlp
+from link_extract import links
 
 OUTPUT_DIR = "/tmp/"
 
@@ -19,7 +19,6 @@ SEARCH_STRING = sys.argv[1]
 REFINE_STRING = sys.argv[2]
 URL = SEARCH_STRING
 page = requests.get(URL)
-soup = BeautifulSoup(page.content, "html.parser")
 
 def get_base(ID):
     LEN = len(ID) - 1
@@ -41,8 +40,7 @@ def parse_identifier(FULL_PATH):
     #print(f"{ID} {BASE_RANGE} {VIDEO_NAME}")
     return YTDL_COMMAND
 
-for a in soup.find_all('a', href=True):
-    THIS_HREF = a['href']
+for THIS_HREF in links(page.content):
     if REFINE_STRING in THIS_HREF:
         #THIS_URL=parse_identifier(THIS_HREF)
         #print(f"yt-dlp {THIS_URL} -o /tmp/")
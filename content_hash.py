@@ -0,0 +1,159 @@
+# #############################################################################
+# Description:  Finds byte-identical media files by content, narrowing the
+#               candidates in stages (size, then head/tail hash, then full
+#               hash) and caching hashes on disk keyed by path, size and mtime.
+#
+# #############################################################################
+
+import hashlib
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from sqlite_cache import SqliteCache, stat_or_none
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pympv", "hash_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 500000
+# Bytes hashed from each end of a file for the quick partial hash.
+EDGE_BYTES = 4 * 1024 * 1024
+# Read buffer for full hashes. Large reads keep NAS round trips down.
+READ_BUFFER_BYTES = 8 * 1024 * 1024
+DEFAULT_HASH_WORKERS = 4
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+def partial_hash(path, size, edge_bytes=EDGE_BYTES):
+    """Hashes the size plus the first and last `edge_bytes` of a file."""
+    digest = _new_hash()
+    digest.update(size.to_bytes(8, 'little'))
+    with open(path, 'rb') as fp:
+        digest.update(fp.read(edge_bytes))
+        if size > edge_bytes:
+            fp.seek(max(edge_bytes, size - edge_bytes))
+            digest.update(fp.read(edge_bytes))
+    return digest.hexdigest()
+
+def full_hash(path):
+    """Hashes the whole file, reading through one reusable buffer."""
+    digest = _new_hash()
+    buffer = bytearray(READ_BUFFER_BYTES)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as fp:
+        while True:
+            count = fp.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+class HashCache(SqliteCache):
+    """On-disk cache of partial and full content hashes keyed on (path, st_size, st_mtime_ns).
+
+    Works like media_probe.ProbeCache: entries are ignored once a file's size
+    or mtime changes, and the least recently used rows are dropped once the
+    cache holds more than `max_entries`.
+    """
+
+    table = 'hashes'
+    key = 'path'
+    columns = ('size INTEGER NOT NULL', 'mtime_ns INTEGER NOT NULL', 'partial TEXT', 'full TEXT')
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(db_path, max_entries)
+
+    def get(self, path, stat):
+        """Returns (partial, full) for `path` if its stat still matches, else (None, None)."""
+        row = self.conn.execute(
+            "SELECT partial, full FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row is None:
+            return None, None
+        self.touch(path)
+        return row
+
+    def put(self, path, stat, partial=None, full=None):
+        """Stores hashes for `path`, keeping any already cached for the same size and mtime."""
+        cached_partial, cached_full = self.get(path, stat)
+        self.write(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, partial, full, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, partial or cached_partial, full or cached_full, time.time()),
+        )
+
+def _hash_or_none(hash_func, *args):
+    try:
+        return hash_func(*args)
+    except OSError:
+        return None
+
+def _hash_stage(executor, groups, stats, hash_cache, stage):
+    """Splits each candidate group by the partial or full hash of its members."""
+    cache_column = 0 if stage == 'partial' else 1
+    results = {}
+    to_hash = []
+    for paths in groups:
+        for path in paths:
+            cached = hash_cache.get(path, stats[path])[cache_column] if hash_cache is not None else None
+            if cached:
+                results[path] = cached
+            else:
+                to_hash.append(path)
+
+    if stage == 'partial':
+        hashed = executor.map(lambda path: _hash_or_none(partial_hash, path, stats[path].st_size), to_hash)
+    else:
+        hashed = executor.map(lambda path: _hash_or_none(full_hash, path), to_hash)
+    for path, digest in zip(to_hash, hashed):
+        if digest is None:
+            continue
+        results[path] = digest
+        if hash_cache is not None:
+            if stage == 'partial':
+                hash_cache.put(path, stats[path], partial=digest)
+            else:
+                hash_cache.put(path, stats[path], full=digest)
+
+    split = []
+    for paths in groups:
+        by_digest = defaultdict(list)
+        for path in paths:
+            if path in results:
+                by_digest[results[path]].append(path)
+        split.extend((digest, members) for digest, members in by_digest.items() if len(members) > 1)
+    return split
+
+def find_identical_files(paths, hash_cache=None, workers=DEFAULT_HASH_WORKERS):
+    """Groups paths whose contents are byte-identical.
+
+    Candidates are narrowed in stages so most files are never read in full:
+    first by size, then by a hash of their first and last EDGE_BYTES, and only
+    the survivors get a full BLAKE2 hash. Returns a dict of digest -> paths
+    for every group with more than one member.
+    """
+    paths = list(dict.fromkeys(path for path in paths if path))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Stage 1: group by size, which costs only a stat
+        stats = dict(zip(paths, executor.map(stat_or_none, paths)))
+        by_size = defaultdict(list)
+        for path, stat in stats.items():
+            if stat is not None and stat.st_size > 0:
+                by_size[stat.st_size].append(path)
+        groups = [members for members in by_size.values() if len(members) > 1]
+
+        # Stage 2: head and tail hash
+        partial_groups = _hash_stage(executor, groups, stats, hash_cache, 'partial')
+
+        # Files no bigger than both edges were hashed in full by the partial hash already
+        identical = {}
+        to_verify = []
+        for digest, members in partial_groups:
+            if stats[members[0]].st_size <= 2 * EDGE_BYTES:
+                identical[digest] = members
+            else:
+                to_verify.append(members)
+
+        # Stage 3: full hash of whatever is left
+        for digest, members in _hash_stage(executor, to_verify, stats, hash_cache, 'full'):
+            identical[digest] = members
+    return identical
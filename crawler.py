@@ -0,0 +1,221 @@
+# #############################################################################
+# Description:  A small asyncio crawl engine for the page scrapers.
+#
+#               Pages are fetched concurrently from a bounded frontier, with a
+#               cap on requests in flight per host and every URL visited at
+#               most once. Scripts supply a parse function that turns a page
+#               into links to follow and things it found (video links, image
+#               URLs, ...); downloading what was found is left to the caller.
+#               Given an http_cache.HttpCache, pages are served from and
+#               revalidated against it instead of always being downloaded.
+#               Crawls of other people's sites can obey robots.txt and space
+#               out their requests to each host.
+#
+# #############################################################################
+
+import asyncio
+import sys
+from collections import namedtuple
+from urllib.parse import urldefrag, urlparse
+from urllib.robotparser import RobotFileParser
+import aiohttp
+from http_cache import cacheable, validators
+
+DEFAULT_WORKERS = 16
+DEFAULT_PER_HOST = 4
+# Most URLs waiting to be fetched; links found beyond this are dropped.
+DEFAULT_MAX_FRONTIER = 10000
+DEFAULT_TIMEOUT = 30
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) pympv-crawler"
+# The name robots.txt rules are matched against; "*" rules apply as well.
+ROBOTS_AGENT = "pympv-crawler"
+
+# What a parse function is given: the final URL after redirects, the HTTP
+# status, the page body (bytes) and how many links deep it was from a seed.
+Page = namedtuple('Page', ['url', 'status', 'content', 'depth'])
+
+def normalize_url(url):
+    """Drops the fragment, so page.html#top and page.html count as one URL."""
+    return urldefrag(url)[0]
+
+class Crawler:
+    """Fetches pages breadth first from a set of seeds.
+
+    `parse(page)` is called for every fetched page and returns
+    (links to follow, found items). Links are followed while they're within
+    `max_depth` of a seed; found items are collected in the order their pages
+    were parsed, without duplicates. If given, `on_found(item)` is called the
+    first time each item turns up, so work on it (e.g. queueing a download)
+    can start while the crawl goes on; it runs on the event loop, so it
+    should hand the work off rather than do it.
+
+    With a `cache`, pages it holds within their TTL aren't requested at all
+    and stale ones are fetched with a conditional GET. With `robots`, each
+    host's robots.txt is fetched first and pages it disallows are skipped.
+    Requests to a host start at least `delay` seconds apart, or its
+    robots.txt Crawl-delay if that's longer.
+    """
+
+    def __init__(self, parse, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                 max_frontier=DEFAULT_MAX_FRONTIER, max_depth=1, max_pages=None, timeout=DEFAULT_TIMEOUT,
+                 on_found=None, cache=None, robots=False, delay=0):
+        self.parse = parse
+        self.on_found = on_found
+        self.cache = cache
+        self.robots = robots
+        self.delay = delay
+        self.workers = workers
+        self.per_host = per_host
+        self.max_frontier = max_frontier
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.seen = set()
+        self.found = {}
+        self.pages_fetched = 0
+        self.dropped = 0
+        self.disallowed = 0
+        self.errors = 0
+
+    async def crawl(self, seeds):
+        """Crawls from `seeds` until the frontier is empty and returns the found items."""
+        self.frontier = asyncio.Queue(maxsize=self.max_frontier)
+        self.host_limits = {}
+        self.host_delays = {}
+        self.next_request = {}
+        self.robots_rules = {}
+        for url in seeds:
+            self._enqueue(url, 0)
+        connector = aiohttp.TCPConnector(limit=self.workers, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={'User-Agent': USER_AGENT}) as session:
+            tasks = [asyncio.create_task(self._worker(session)) for _ in range(self.workers)]
+            try:
+                await self.frontier.join()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        return list(self.found)
+
+    def _enqueue(self, url, depth):
+        url = normalize_url(url)
+        if url in self.seen or urlparse(url).scheme not in ('http', 'https'):
+            return
+        if self.max_pages is not None and len(self.seen) >= self.max_pages:
+            self.dropped += 1
+            return
+        try:
+            # Never block here: workers enqueue links, so waiting on a full
+            # queue could leave every worker waiting on every other.
+            self.frontier.put_nowait((url, depth))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self.seen.add(url)
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self.host_limits[host]
+
+    async def _allowed(self, session, url):
+        host = urlparse(url).netloc
+        if host not in self.robots_rules:
+            # Stored as a task, so workers reaching a new host together share one fetch
+            self.robots_rules[host] = asyncio.ensure_future(self._fetch_robots(session, url))
+        rules = await self.robots_rules[host]
+        return rules.can_fetch(ROBOTS_AGENT, url)
+
+    async def _fetch_robots(self, session, url):
+        parts = urlparse(url)
+        rules = RobotFileParser(f"{parts.scheme}://{parts.netloc}/robots.txt")
+        try:
+            async with self._host_limit(url):
+                await self._wait_turn(parts.netloc)
+                async with session.get(rules.url) as response:
+                    text = await response.text(errors='replace')
+                    status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status = None
+        # The same rules as RobotFileParser.read(): 401/403 forbid everything,
+        # any other failure allows everything.
+        if status in (401, 403):
+            rules.disallow_all = True
+        elif status == 200:
+            rules.parse(text.splitlines())
+            crawl_delay = rules.crawl_delay(ROBOTS_AGENT)
+            if crawl_delay and float(crawl_delay) > self.delay:
+                self.host_delays[parts.netloc] = float(crawl_delay)
+        else:
+            rules.allow_all = True
+        return rules
+
+    async def _wait_turn(self, host):
+        """Sleeps until this host's next request may start."""
+        delay = self.host_delays.get(host, self.delay)
+        if not delay:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Claim the slot before sleeping, so requests waiting together are spaced out too
+        start = max(now, self.next_request.get(host, now))
+        self.next_request[host] = start + delay
+        await asyncio.sleep(start - now)
+
+    async def _worker(self, session):
+        while True:
+            url, depth = await self.frontier.get()
+            try:
+                if self.robots and not await self._allowed(session, url):
+                    self.disallowed += 1
+                    continue
+                page = await self._fetch(session, url, depth)
+                if page is not None:
+                    links, found = self.parse(page)
+                    for item in found:
+                        if item not in self.found:
+                            self.found[item] = None
+                            if self.on_found is not None:
+                                self.on_found(item)
+                    if depth < self.max_depth:
+                        for link in links:
+                            self._enqueue(link, depth + 1)
+            except Exception as e:
+                # One bad page mustn't stop the crawl
+                self.errors += 1
+                print(f"Failed to crawl {url}: {e}", file=sys.stderr)
+            finally:
+                self.frontier.task_done()
+
+    async def _fetch(self, session, url, depth):
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and cached.fresh:
+            return Page(cached.url, cached.status, cached.content, depth)
+        async with self._host_limit(url):
+            await self._wait_turn(urlparse(url).netloc)
+            try:
+                async with session.get(url, headers=validators(cached)) as response:
+                    content = await response.read()
+                    self.pages_fetched += 1
+                    if response.status == 304 and cached is not None:
+                        self.cache.revalidated(url)
+                        return Page(cached.url, cached.status, cached.content, depth)
+                    if response.status >= 400:
+                        self.errors += 1
+                        print(f"Fetching {url} returned status {response.status}", file=sys.stderr)
+                        return None
+                    if self.cache is not None and cacheable(response.status, response.headers):
+                        self.cache.put(url, str(response.url), response.status, content,
+                                       response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                    return Page(str(response.url), response.status, content, depth)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.errors += 1
+                print(f"Could not fetch {url}: {e}", file=sys.stderr)
+                return None
+
+def crawl(seeds, parse, **options):
+    """Runs a Crawler over `seeds` from synchronous code and returns the found items."""
+    return asyncio.run(Crawler(parse, **options).crawl(seeds))
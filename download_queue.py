@@ -0,0 +1,180 @@
+# #############################################################################
+# Description:  A download scheduler for the scrapers. Jobs are queued as the
+#               pages are parsed and run on a pool of worker threads, each of
+#               which keeps one yt_dlp.YoutubeDL for all of its jobs, with a
+#               cap on concurrent downloads per host.
+#
+# #############################################################################
+
+import os
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, as_completed, wait
+from urllib.parse import urlparse
+import yt_dlp
+
+DEFAULT_WORKERS = 4
+DEFAULT_PER_HOST = 2
+# Several downloads share the terminal, so yt-dlp's progress bars are turned off.
+DEFAULT_YDL_OPTIONS = {'noprogress': True}
+
+# What a job's future resolves to. `error` is None when the file was downloaded.
+DownloadResult = namedtuple('DownloadResult', ['url', 'filename', 'size', 'seconds', 'error'])
+
+def host_of(url):
+    # Protocol-relative links (//cdn.example/...) still have a netloc
+    return urlparse(url).netloc.lower()
+
+def format_throughput(size, seconds):
+    megabytes = size / (1024 * 1024)
+    return f"{megabytes:.1f} MB in {seconds:.1f}s ({megabytes / seconds if seconds else 0:.2f} MB/s)"
+
+class DownloadQueue:
+    """Runs yt-dlp downloads on `workers` threads, at most `per_host` at a time per host.
+
+    submit() returns a Future resolving to a DownloadResult, so callers can
+    keep parsing while downloads run and pick results up as they finish.
+    Throughput is printed per job and, on close(), for the whole run.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, ydl_options=None):
+        self.per_host = per_host
+        self.ydl_options = dict(DEFAULT_YDL_OPTIONS, **(ydl_options or {}))
+        self.pending = deque()
+        self.active_hosts = Counter()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.started = time.perf_counter()
+        self.total_bytes = 0
+        self.completed = 0
+        self.failed = 0
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, url, filename):
+        """Queues a download of `url` to `filename` and returns its Future."""
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("submit() called on a closed DownloadQueue")
+            self.pending.append((url, filename, future))
+            self.condition.notify()
+        return future
+
+    def _next_job(self):
+        """Takes the oldest job whose host has a free slot, waiting if there is none."""
+        with self.condition:
+            while True:
+                for index, job in enumerate(self.pending):
+                    host = host_of(job[0])
+                    if self.active_hosts[host] < self.per_host:
+                        del self.pending[index]
+                        self.active_hosts[host] += 1
+                        return job
+                if self.closed and not self.pending:
+                    return None
+                self.condition.wait()
+
+    def _work(self):
+        # One YoutubeDL per thread, reused for every job the thread runs
+        ydl = yt_dlp.YoutubeDL(dict(self.ydl_options))
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            url, filename, future = job
+            if not future.set_running_or_notify_cancel():
+                self._release(url)
+                continue
+            result = self._download(ydl, url, filename)
+            self._release(url, result)
+            future.set_result(result)
+
+    def _download(self, ydl, url, filename):
+        ydl.params['outtmpl'] = {'default': filename}
+        started = time.perf_counter()
+        try:
+            ydl.download([url])
+        except Exception as e:
+            return DownloadResult(url, filename, 0, time.perf_counter() - started, str(e) or type(e).__name__)
+        seconds = time.perf_counter() - started
+        if not os.path.isfile(filename):
+            return DownloadResult(url, filename, 0, seconds, "no file was written")
+        size = os.path.getsize(filename)
+        print(f"Downloaded {os.path.basename(filename)}: {format_throughput(size, seconds)}")
+        return DownloadResult(url, filename, size, seconds, None)
+
+    def _release(self, url, result=None):
+        with self.condition:
+            self.active_hosts[host_of(url)] -= 1
+            if result is not None:
+                if result.error is None:
+                    self.completed += 1
+                    self.total_bytes += result.size
+                else:
+                    self.failed += 1
+            self.condition.notify_all()
+
+    def close(self, wait=True, cancel=False):
+        """Stops accepting jobs; with `wait`, runs the queue dry and prints the overall throughput.
+
+        Without `wait`, or with `cancel`, jobs not yet started are cancelled
+        rather than run; `wait` then still waits for the running ones.
+        """
+        with self.condition:
+            self.closed = True
+            if cancel or not wait:
+                while self.pending:
+                    self.pending.popleft()[2].cancel()
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+            print(f"{self.completed} downloads, {self.failed} failed: "
+                  f"{format_throughput(self.total_bytes, time.perf_counter() - self.started)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.close(wait=exc_type is None)
+
+def completed(futures):
+    """Yields DownloadResults in the order their downloads finish."""
+    for future in as_completed(futures):
+        if not future.cancelled():
+            yield future.result()
+
+def prefetched(queue, jobs, limit):
+    """Downloads `jobs` ahead of the caller, yielding (DownloadResult, context) as they finish.
+
+    `jobs` is an iterable of (url, filename, context). At most `limit` of
+    them are queued, downloading or finished but not yet consumed at once,
+    so the caller can take its time over each result (e.g. reviewing it)
+    while the next few download, without filling the disk with the rest.
+    """
+    jobs = iter(jobs)
+    in_flight = {}
+
+    def top_up():
+        while len(in_flight) < limit:
+            job = next(jobs, None)
+            if job is None:
+                return
+            url, filename, context = job
+            in_flight[queue.submit(url, filename)] = context
+
+    top_up()
+    while in_flight:
+        # Of the finished jobs, hand over the one queued first, so none waits behind later ones
+        future = next((future for future in in_flight if future.done()), None)
+        if future is None:
+            wait(in_flight, return_when=FIRST_COMPLETED)
+            future = next(future for future in in_flight if future.done())
+        context = in_flight.pop(future)
+        # Start the next download before handing this result over
+        top_up()
+        if not future.cancelled():
+            yield future.result(), context
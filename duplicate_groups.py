@@ -0,0 +1,197 @@
+# #############################################################################
+# Description:  Batched duplicate grouping for the duplicate finder. Grouping
+#               keys are encoded as integer codes for the whole library at
+#               once, and only the codes shared by several items are ever
+#               turned back into groups.
+#
+#               NumPy is used for combining, counting and sorting the codes
+#               when installed; otherwise the same steps run on plain lists.
+#
+# #############################################################################
+
+import bisect
+import operator
+from collections import Counter
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def _provider_columns(items):
+    """Every provider id of every item, so items sharing any one id are grouped."""
+    positions, prov_keys, prov_ids = [], [], []
+    for position, item in enumerate(items):
+        for prov_key, prov_id in item.providers:
+            positions.append(position)
+            prov_keys.append(prov_key)
+            prov_ids.append(prov_id)
+    return positions, [prov_keys, prov_ids]
+
+def _title_columns(items):
+    """Name and year, only for items without provider ids (the movie fallback)."""
+    positions = [position for position, item in enumerate(items) if item.name and not item.providers]
+    return positions, [[items[p].name for p in positions], [items[p].year for p in positions]]
+
+def _name_year_columns(items):
+    """Name and year for every item."""
+    positions = [position for position, item in enumerate(items) if item.name]
+    return positions, [[items[p].name for p in positions], [items[p].year for p in positions]]
+
+def _episode_columns(items):
+    """Series, season and episode number."""
+    positions = [
+        position for position, item in enumerate(items)
+        if item.series and item.season and item.episode is not None
+    ]
+    return positions, [
+        [items[p].series for p in positions],
+        [items[p].season for p in positions],
+        [items[p].episode for p in positions],
+    ]
+
+def _provider_label(prov_key, prov_id):
+    return f"{prov_key}:{prov_id}"
+
+def _name_label(name, year):
+    return f"name:{name} ({year})" if year else f"name:{name}"
+
+def _episode_label(series, season, episode):
+    return f"{series} - {season} - E{episode:02d}"
+
+# Strategy name -> (kind, function returning item positions and key columns
+# for a list of LibraryItems). Strategies of the same kind share one key
+# space, so e.g. 'title' and 'name-year' keys for the same name and year match.
+KEY_STRATEGIES = {
+    'providers': ('provider', _provider_columns),
+    'title': ('name', _title_columns),
+    'name-year': ('name', _name_year_columns),
+    'episode': ('episode', _episode_columns),
+}
+KIND_LABELS = {'provider': _provider_label, 'name': _name_label, 'episode': _episode_label}
+MOVIE_STRATEGIES = ('providers', 'title')
+EPISODE_STRATEGIES = ('episode',)
+
+def _column_codes(column):
+    """Maps each value in a column to a dense integer code; returns (codes, number of codes)."""
+    values = dict.fromkeys(column)
+    values = dict(zip(values, range(len(values))))
+    return list(map(values.__getitem__, column)), len(values)
+
+def _encode(columns):
+    """Encodes rows spread over `columns` as dense integer codes, one column at a time.
+
+    Each column is coded on its own, where hashing is cheap (strings cache
+    their hash), and folded into the running code, which is made dense again
+    after every column so it never grows past the row count.
+    """
+    codes, count = _column_codes(columns[0])
+    for column in columns[1:]:
+        column_codes, radix = _column_codes(column)
+        if numpy is not None:
+            combined = numpy.asarray(codes, dtype=numpy.int64) * radix + numpy.asarray(column_codes, dtype=numpy.int64)
+            uniques, codes = numpy.unique(combined, return_inverse=True)
+            codes, count = codes.tolist(), len(uniques)
+        else:
+            # map() with operator functions keeps the arithmetic out of the interpreter loop
+            codes, count = _column_codes(list(map(operator.add, map(operator.mul, codes, repeat(radix)), column_codes)))
+    return codes, count
+
+def _shared_codes(codes, code_count):
+    """Returns {code: [row indexes]} for every code held by more than one row."""
+    if numpy is not None:
+        codes = numpy.asarray(codes, dtype=numpy.int64)
+        rows = numpy.flatnonzero(numpy.bincount(codes, minlength=code_count)[codes] > 1)
+        rows = rows[numpy.argsort(codes[rows], kind='stable')]
+        shared = codes[rows]
+        starts = numpy.flatnonzero(numpy.diff(shared, prepend=-1))
+        return {
+            int(code): members.tolist()
+            for code, members in zip(shared[starts], numpy.split(rows, starts[1:]))
+        }
+    repeated = {code for code, count in Counter(codes).items() if count > 1}
+    shared = {}
+    for row in [row for row, code in enumerate(codes) if code in repeated]:
+        shared.setdefault(codes[row], []).append(row)
+    return shared
+
+def find_groups(items, strategies):
+    """Groups LibraryItems that share a key under any of `strategies`.
+
+    Every key is mapped to an integer code in one pass over the library, the
+    codes held by more than one item are found in bulk, and items linked
+    through different keys (e.g. the same Tmdb id on one pair and the same
+    Imdb id on another) are merged into a single group. Returns {label: items}
+    for every group with more than one item, labelled by the first key that
+    linked it, with items in library order.
+    """
+    items = list(items)
+    # Rows from strategies of the same kind are coded together
+    kinds = {}
+    merged_kinds = set()
+    for strategy in strategies:
+        kind, columns_func = KEY_STRATEGIES[strategy]
+        positions, columns = columns_func(items)
+        if kind not in kinds:
+            kinds[kind] = (positions, columns)
+        else:
+            merged_kinds.add(kind)
+            kinds[kind][0].extend(positions)
+            for merged, column in zip(kinds[kind][1], columns):
+                merged.extend(column)
+
+    positions, codes, segments = [], [], []
+    for kind, (kind_positions, columns) in kinds.items():
+        if not kind_positions:
+            continue
+        kind_codes, count = _encode(columns)
+        if kind in merged_kinds:
+            # Overlapping strategies (e.g. 'title' and 'name-year') give some
+            # items the same key twice, which would make them their own duplicate
+            first_rows = {}
+            for index, row in enumerate(zip(kind_positions, kind_codes)):
+                first_rows.setdefault(row, index)
+            if len(first_rows) < len(kind_positions):
+                keep = sorted(first_rows.values())
+                kind_positions = [kind_positions[index] for index in keep]
+                kind_codes = [kind_codes[index] for index in keep]
+                columns = [[column[index] for index in keep] for column in columns]
+        offset = len(segments) and segments[-1][1]
+        segments.append((len(positions), offset + count, kind, columns))
+        positions.extend(kind_positions)
+        codes.extend(map(operator.add, kind_codes, repeat(offset)) if offset else kind_codes)
+    if not positions:
+        return {}
+    shared = _shared_codes(codes, segments[-1][1])
+
+    # Union the members of every shared code; only duplicates get this far,
+    # so this loop is small however big the library is.
+    parent = {}
+
+    def root(position):
+        while parent.setdefault(position, position) != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    for rows in shared.values():
+        first = root(positions[rows[0]])
+        for row in rows[1:]:
+            other = root(positions[row])
+            if other != first:
+                parent[max(first, other)] = min(first, other)
+                first = min(first, other)
+
+    # Label each group by the earliest row that linked it
+    segment_starts = [segment[0] for segment in segments]
+    labels = {}
+    for row in sorted(rows[0] for rows in shared.values()):
+        group_root = root(positions[row])
+        if group_root not in labels:
+            start, _, kind, columns = segments[bisect.bisect_right(segment_starts, row) - 1]
+            labels[group_root] = KIND_LABELS[kind](*(column[row - start] for column in columns))
+    groups = {}
+    for position in sorted(parent):
+        groups.setdefault(root(position), []).append(items[position])
+    return {labels[group_root]: members for group_root, members in groups.items() if len(members) > 1}
@@ -0,0 +1,177 @@
+# #############################################################################
+# Description:  Keeper policies and report output for the duplicate finder.
+#               Picks which copy of each duplicate group to keep without
+#               asking, and writes the cleanup script plus JSON/CSV reports
+#               through one buffered handle each.
+#
+# #############################################################################
+
+import csv
+import datetime
+import json
+import os
+import shlex
+
+# Criteria a keeper policy can be made of, each giving a sort key where
+# bigger is better. Candidates are the dicts built by describe_candidate().
+KEEPER_CRITERIA = {
+    'largest': lambda candidate, formats: candidate['size'],
+    'smallest': lambda candidate, formats: -candidate['size'],
+    'newest': lambda candidate, formats: candidate['mtime'] or 0,
+    'oldest': lambda candidate, formats: -(candidate['mtime'] or float('inf')),
+    'format': lambda candidate, formats: _format_rank(candidate['format'], formats),
+}
+DEFAULT_KEEPER_POLICY = ('format', 'largest', 'newest')
+CSV_COLUMNS = ('group', 'action', 'name', 'path', 'size_mb', 'modified', 'format')
+# Output buffer for the script and reports; a group's lines are written in one go anyway.
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+def _format_rank(media_format, preferred_formats):
+    """Ranks a probed format by its place in preferred_formats; formats not listed rank lowest."""
+    media_format = (media_format or '').lower()
+    for rank, preferred in enumerate(preferred_formats):
+        if preferred.lower() in media_format:
+            return len(preferred_formats) - rank
+    return 0
+
+def describe_candidate(item, probe_result):
+    """Returns the details of one duplicate item the policy and the reports work from.
+
+    `probe_result` is the (stat, format) pair from media_probe.probe_files;
+    the file's stat wins over the size Jellyfin reported.
+    """
+    stat, media_format = probe_result if probe_result else (None, "Unknown")
+    candidate = {
+        'name': item.name,
+        'path': item.path,
+        'exists': False,
+        'size': item.size or 0,
+        'size_mb': round((item.size or 0) / (1024 * 1024), 2),
+        'mtime': None,
+        'modified': "Unknown",
+        'format': media_format,
+    }
+    if stat is not None:
+        candidate['exists'] = True
+        candidate['size'] = stat.st_size
+        candidate['size_mb'] = round(stat.st_size / (1024 * 1024), 2)
+        candidate['mtime'] = stat.st_mtime
+        candidate['modified'] = datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+    return candidate
+
+def parse_policy(policy):
+    """Parses a comma separated list of KEEPER_CRITERIA names, raising ValueError on unknown ones."""
+    criteria = tuple(name.strip() for name in policy.split(',') if name.strip())
+    unknown = [name for name in criteria if name not in KEEPER_CRITERIA]
+    if unknown or not criteria:
+        raise ValueError(f"unknown keeper criteria {', '.join(unknown) or '(none)'}; "
+                         f"choose from {', '.join(KEEPER_CRITERIA)}")
+    return criteria
+
+def choose_keeper(candidates, policy=DEFAULT_KEEPER_POLICY, preferred_formats=()):
+    """Returns the index of the candidate to keep.
+
+    Criteria are applied in order, each later one only breaking ties left by
+    the ones before it. Files that exist are preferred over ones that
+    couldn't be found; full ties go to the first candidate in library order.
+    """
+    eligible = [index for index, candidate in enumerate(candidates) if candidate['exists']] or range(len(candidates))
+    return max(
+        eligible,
+        key=lambda index: (tuple(KEEPER_CRITERIA[name](candidates[index], preferred_formats) for name in policy), -index),
+    )
+
+def _same_file(path, other):
+    if os.path.realpath(path) == os.path.realpath(other):
+        return True
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+def batch_deletes(candidates, keeper):
+    """Returns the indexes of the candidates a batch run may delete, given the keeper's index.
+
+    Only files that exist are deleted, and never one that is the keeper's file
+    or a file already marked for deletion under another path: several Jellyfin
+    entries can point at the same file (see jellyfin_reader.py), and deleting
+    one would delete them all. Those entries are left for review.
+    """
+    kept = candidates[keeper]['path']
+    deletes = []
+    for index, candidate in enumerate(candidates):
+        if index == keeper or not candidate['exists'] or not candidate['path']:
+            continue
+        if (kept and _same_file(candidate['path'], kept)) or \
+                any(_same_file(candidate['path'], candidates[other]['path']) for other in deletes):
+            continue
+        deletes.append(index)
+    return deletes
+
+class CleanupWriter:
+    """Writes the cleanup script, and optionally JSON and CSV reports, group by group.
+
+    Each output is opened once and buffered, so writing costs one syscall per
+    buffer-full rather than an open/append/close per line. Use as a context
+    manager, or call close() to finish the JSON array and flush everything.
+    """
+
+    def __init__(self, script_path, json_path=None, csv_path=None):
+        self.script = open(script_path, 'w', buffering=WRITE_BUFFER_BYTES)
+        self.script.write("#!/bin/bash\n")
+        self.script.write("# This script was generated by jellyfin_find_duplicates.py\n")
+        self.script.write(f"# Generated on: {datetime.datetime.now()}\n")
+        self.script.write("# Review the commands before executing!\n\n")
+        self.json = None
+        self.json_groups = 0
+        if json_path:
+            self.json = open(json_path, 'w', buffering=WRITE_BUFFER_BYTES)
+            self.json.write("[\n")
+        self.csv_file = None
+        self.csv = None
+        if csv_path:
+            self.csv_file = open(csv_path, 'w', newline='', buffering=WRITE_BUFFER_BYTES)
+            self.csv = csv.writer(self.csv_file)
+            self.csv.writerow(CSV_COLUMNS)
+
+    def write_group(self, key, candidates, deletes=(), keeper=None):
+        """Records one duplicate group: a comment per candidate, then an rm per index in `deletes`."""
+        lines = [
+            f"# rm {shlex.quote(candidate['path'] or '')} # {candidate['name']} (Size: {candidate['size_mb']} MB, "
+            f"Modified: {candidate['modified']}, Format: {candidate['format']})\n"
+            for candidate in candidates
+        ]
+        lines.extend(f"rm {shlex.quote(candidates[index]['path'])}\n" for index in deletes)
+        self.script.write(''.join(lines))
+
+        actions = ['delete' if index in deletes else 'keep' if index == keeper else 'review'
+                   for index in range(len(candidates))]
+        if self.json is not None:
+            entry = {
+                'group': key,
+                'items': [
+                    dict({field: candidate[field] for field in CSV_COLUMNS[2:]}, action=action)
+                    for candidate, action in zip(candidates, actions)
+                ],
+            }
+            self.json.write((",\n" if self.json_groups else "") + json.dumps(entry))
+            self.json_groups += 1
+        if self.csv is not None:
+            self.csv.writerows(
+                [key, action] + [candidate[field] for field in CSV_COLUMNS[2:]]
+                for candidate, action in zip(candidates, actions)
+            )
+
+    def close(self):
+        self.script.close()
+        if self.json is not None:
+            self.json.write("\n]\n")
+            self.json.close()
+        if self.csv_file is not None:
+            self.csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,106 @@
+# #############################################################################
+# Description:  Concurrent checks of YouTube channel feeds for the Takeout to
+#               OPML converter, so channels that are gone can be flagged or
+#               left out rather than found by the feed reader.
+#
+#               Feeds are fetched over one pooled aiohttp session, through an
+#               http_cache.HttpCache: a feed fetched before is revalidated with
+#               a conditional GET, so a repeat run is almost all 304s. Feeds
+#               get a cache of their own (FEED_CACHE_PATH), holding just their
+#               validators and first bytes, so a long subscription list
+#               doesn't push the scrapers' pages out of theirs.
+#               Results come back in input order from a sliding window of
+#               requests, so a long subscription list streams through.
+#
+# #############################################################################
+
+import asyncio
+import os
+from collections import deque, namedtuple
+import aiohttp
+from http_cache import cacheable, validators
+
+FEED_URL = "https://www.youtube.com/feeds/videos.xml?channel_id="
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pympv", "feed_cache.sqlite")
+# Bytes of a feed looked at to tell it from an HTML page, and all that's cached of it.
+SNIFF_BYTES = 2048
+DEFAULT_CONCURRENCY = 32
+DEFAULT_TIMEOUT = 20
+# Statuses that mean the channel is gone, not that the request failed.
+DEAD_STATUSES = (404, 410)
+
+# The outcome for one feed. `state` is 'ok', 'dead' (the server says it's
+# gone, or it isn't a feed) or 'error' (couldn't tell: timeouts, 5xx, ...);
+# `detail` says why for the last two. `revalidated` is True for a 304.
+FeedStatus = namedtuple('FeedStatus', ['url', 'state', 'status', 'detail', 'revalidated'])
+
+def looks_like_feed(content):
+    """A feed is Atom; YouTube answers some dead channels with an HTML page instead of an error."""
+    return b'<feed' in content[:SNIFF_BYTES]
+
+class FeedChecker:
+    """Checks feeds with at most `concurrency` requests in flight.
+
+    Use as an async context manager, which opens and closes the session.
+    """
+
+    def __init__(self, cache=None, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.cache = cache
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.counts = {'ok': 0, 'dead': 0, 'error': 0, 'revalidated': 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def check(self, url):
+        """Fetches one feed and returns its FeedStatus."""
+        result = await self._check(url)
+        self.counts[result.state] += 1
+        self.counts['revalidated'] += result.revalidated
+        return result
+
+    async def _check(self, url):
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and cached.fresh:
+            return FeedStatus(url, 'ok', cached.status, None, False)
+        try:
+            async with self.session.get(url, headers=validators(cached)) as response:
+                content = await response.read()
+                if response.status == 304 and cached is not None:
+                    self.cache.revalidated(url)
+                    return FeedStatus(url, 'ok', cached.status, None, True)
+                if response.status in DEAD_STATUSES:
+                    return FeedStatus(url, 'dead', response.status, f"HTTP {response.status}", False)
+                if response.status != 200:
+                    return FeedStatus(url, 'error', response.status, f"HTTP {response.status}", False)
+                if not looks_like_feed(content):
+                    return FeedStatus(url, 'dead', response.status, "not a feed", False)
+                if self.cache is not None and cacheable(response.status, response.headers):
+                    # A recheck only needs the validators, so the rest of the feed isn't kept
+                    self.cache.put(url, str(response.url), response.status, content[:SNIFF_BYTES],
+                                   response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                return FeedStatus(url, 'ok', response.status, None, False)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return FeedStatus(url, 'error', None, str(e) or type(e).__name__, False)
+
+    async def check_in_order(self, items, url_of):
+        """Yields (item, FeedStatus) for each of `items`, in order, keeping `concurrency` checks running."""
+        window = deque()
+        items = iter(items)
+        while True:
+            while len(window) < self.concurrency:
+                item = next(items, None)
+                if item is None:
+                    break
+                window.append((item, asyncio.ensure_future(self.check(url_of(item)))))
+            if not window:
+                return
+            item, task = window.popleft()
+            yield item, await task
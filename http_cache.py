@@ -0,0 +1,147 @@
+# #############################################################################
+# Description:  A persistent HTTP response cache for the scrapers, so search
+#               and listing pages aren't downloaded again on every run.
+#
+#               Responses are kept zlib-compressed in SQLite with their ETag
+#               and Last-Modified. Within the TTL a cached page is used as is;
+#               after it, the page is revalidated with a conditional GET and
+#               the cached body reused on 304 Not Modified. The least recently
+#               used pages are evicted once the bodies pass a size cap.
+#
+#               Settings can be overridden from the environment:
+#                 HTTP_CACHE=0            turn the cache off
+#                 HTTP_CACHE_TTL=<secs>   how long a page is used unchecked
+#                 HTTP_CACHE_MAX_MB=<mb>  cap on the compressed bodies
+#                 HTTP_CACHE_PATH=<file>  where the database lives
+#
+# #############################################################################
+
+import os
+import time
+import zlib
+from collections import namedtuple
+import requests
+from sqlite_cache import SqliteCache
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pympv", "http_cache.sqlite")
+# Seconds a cached page is used without asking the server whether it changed.
+DEFAULT_TTL = 60 * 60
+# Upper bound on the compressed bodies held; the least recently used are evicted first.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TIMEOUT = 30
+# zlib level for stored bodies; HTML compresses well even at low levels.
+COMPRESS_LEVEL = 6
+# Number of new responses written between commits.
+COMMIT_BATCH_SIZE = 20
+
+# A cached response. `url` is the final URL after redirects and `content`
+# the decompressed body; `fresh` is True while it's within the TTL.
+CachedResponse = namedtuple('CachedResponse', ['url', 'status', 'content', 'etag', 'last_modified', 'fresh'])
+
+class HttpCache(SqliteCache):
+    """On-disk cache of successful GET responses keyed on the requested URL.
+
+    get() returns what's stored; a caller sends the validators() of a stale
+    entry with its request, then calls put() with a new response or
+    revalidated() on a 304. Once the stored bodies take up more than
+    `max_bytes` the least recently used are dropped.
+    """
+
+    table = 'response'
+    key = 'url'
+    columns = ('final_url TEXT NOT NULL', 'status INTEGER NOT NULL', 'etag TEXT', 'last_modified TEXT',
+               'body BLOB NOT NULL', 'size INTEGER NOT NULL', 'fetched_at REAL NOT NULL')
+    commit_batch_size = COMMIT_BATCH_SIZE
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(db_path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def get(self, url):
+        """Returns the CachedResponse stored for `url`, or None."""
+        row = self.conn.execute(
+            "SELECT final_url, status, etag, last_modified, body, fetched_at FROM response WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        final_url, status, etag, last_modified, body, fetched_at = row
+        self.touch(url)
+        fresh = time.time() - fetched_at < self.ttl
+        if fresh:
+            self.hits += 1
+        return CachedResponse(final_url, status, zlib.decompress(body), etag, last_modified, fresh)
+
+    def put(self, url, final_url, status, content, etag=None, last_modified=None):
+        """Stores a response to a GET of `url`."""
+        body = zlib.compress(content, COMPRESS_LEVEL)
+        now = time.time()
+        self.write(
+            "INSERT OR REPLACE INTO response"
+            " (url, final_url, status, etag, last_modified, body, size, fetched_at, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, final_url, status, etag, last_modified, body, len(body), now, now),
+        )
+
+    def revalidated(self, url):
+        """Marks the entry for `url` fresh again after the server answered 304 Not Modified."""
+        self.revalidations += 1
+        self.write("UPDATE response SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def evict(self):
+        """Trims the stored bodies down to `max_bytes`, dropping the least recently used rows."""
+        self.conn.execute(
+            "DELETE FROM response WHERE url IN ("
+            " SELECT url FROM ("
+            "  SELECT url, SUM(size) OVER (ORDER BY last_used DESC, url) AS running FROM response)"
+            " WHERE running > ?)",
+            (self.max_bytes,),
+        )
+
+def validators(cached):
+    """Returns the conditional request headers for revalidating a cached response."""
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+    return headers
+
+def cacheable(status, headers):
+    """Only complete successful responses the server hasn't marked no-store are kept."""
+    return status == 200 and 'no-store' not in headers.get('Cache-Control', '').lower()
+
+def cache_from_environment():
+    """Opens an HttpCache configured from the HTTP_CACHE* variables, or returns None if HTTP_CACHE=0."""
+    if os.environ.get('HTTP_CACHE') == '0':
+        return None
+    return HttpCache(
+        db_path=os.environ.get('HTTP_CACHE_PATH', DEFAULT_CACHE_PATH),
+        ttl=float(os.environ.get('HTTP_CACHE_TTL', DEFAULT_TTL)),
+        max_bytes=int(float(os.environ.get('HTTP_CACHE_MAX_MB', DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+    )
+
+def fetch(url, cache=None, session=None, timeout=DEFAULT_TIMEOUT):
+    """GETs `url` with requests through `cache`, returning a CachedResponse.
+
+    Raises requests.HTTPError for error statuses, as raise_for_status() does.
+    """
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None and cached.fresh:
+        return cached
+    response = (session or requests).get(url, headers=validators(cached), timeout=timeout)
+    if response.status_code == 304 and cached is not None:
+        cache.revalidated(url)
+        return cached._replace(fresh=True)
+    response.raise_for_status()
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if cache is not None and cacheable(response.status_code, response.headers):
+        cache.put(url, response.url, response.status_code, response.content, etag, last_modified)
+    return CachedResponse(response.url, response.status_code, response.content, etag, last_modified, True)
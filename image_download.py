@@ -0,0 +1,198 @@
+# #############################################################################
+# Description:  A concurrent, resumable downloader for plain files (images)
+#               for site_images.py.
+#
+#               Downloads run on a pool of threads sharing one requests
+#               session, so connections to a host are reused. Each file is
+#               streamed to <name>.part and renamed into place once complete;
+#               an interrupted .part is resumed with a Range request, and a
+#               file already on disk is skipped when its ETag or size matches.
+#               The ETag (or Last-Modified) a file was fetched with is kept in
+#               a user extended attribute, so it survives the rename.
+#
+#               With an image_store.ImageStore, files are hashed as they
+#               stream in and stored once by content, and URLs the store
+#               already knows aren't requested at all.
+#
+# #############################################################################
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from image_store import new_hash
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = '.part'
+# Extended attribute holding the validator a file was downloaded with.
+VALIDATOR_XATTR = 'user.pympv.validator'
+
+# What a download's future resolves to. `action` is 'downloaded', 'resumed',
+# 'skipped' or 'failed'; `size` is the bytes transferred, `error` None on success.
+ImageResult = namedtuple('ImageResult', ['url', 'filename', 'action', 'size', 'seconds', 'error'])
+
+def _get_validator(path):
+    try:
+        return os.getxattr(path, VALIDATOR_XATTR).decode()
+    except (OSError, AttributeError):
+        # Missing file, no attribute, or a filesystem/platform without xattrs
+        return None
+
+def _set_validator(path, validator):
+    if validator:
+        try:
+            os.setxattr(path, VALIDATOR_XATTR, validator.encode())
+        except (OSError, AttributeError):
+            pass
+
+def response_validator(response):
+    """The strong ETag of a response, or else its Last-Modified; weak ETags can't validate a Range."""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+def _content_range_start(response):
+    # Content-Range: bytes 1000-1999/2000
+    try:
+        return int(response.headers['Content-Range'].split()[1].split('-')[0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+class ImageDownloader:
+    """Downloads files on `workers` threads through one pooled requests session.
+
+    submit() returns a Future resolving to an ImageResult; close() waits for
+    what's queued and prints totals for the run. With a `store`, the
+    filenames given become links into it, and the ImageResult has the name
+    actually used.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, session=None, store=None):
+        self.timeout = timeout
+        self.store = store
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.started = time.perf_counter()
+        self.results = []
+
+    def submit(self, url, filename):
+        """Queues a download of `url` to `filename` and returns its Future."""
+        future = self.executor.submit(self.download, url, filename)
+        future.add_done_callback(lambda future: self.results.append(future.result()))
+        return future
+
+    def download(self, url, filename):
+        """Downloads `url` to `filename` unless it's already there; returns an ImageResult."""
+        started = time.perf_counter()
+        try:
+            if self.store is not None:
+                action, size, filename = self._download_to_store(url, filename)
+            else:
+                action, size, _ = self._download(url, filename, filename + PART_SUFFIX)
+        except (requests.RequestException, OSError) as e:
+            return ImageResult(url, filename, 'failed', 0, time.perf_counter() - started, str(e) or type(e).__name__)
+        return ImageResult(url, filename, action, size, time.perf_counter() - started, None)
+
+    def _download_to_store(self, url, filename):
+        digest = self.store.lookup(url)
+        if digest is not None:
+            return 'skipped', 0, self.store.link(digest, filename)
+        part = self.store.part_path(url)
+        action, size, digest = self._download(url, None, part)
+        self.store.add(url, part, digest)
+        return action, size, self.store.link(digest, filename)
+
+    def _download(self, url, filename, part):
+        """Streams `url` into `part`, resuming it if it's there, and renames it to `filename` if given.
+
+        Returns (action, bytes transferred, hex digest of the whole file).
+        """
+        headers = {}
+        offset = 0
+        if filename is not None and os.path.isfile(filename):
+            existing_size = os.path.getsize(filename)
+            validator = _get_validator(filename)
+            if validator:
+                headers['If-None-Match' if validator.startswith('"') else 'If-Modified-Since'] = validator
+        else:
+            existing_size = None
+            validator = _get_validator(part)
+            if validator and os.path.isfile(part):
+                # If-Range makes the server send the whole file instead if it changed since
+                offset = os.path.getsize(part)
+                headers['Range'] = f"bytes={offset}-"
+                headers['If-Range'] = validator
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                if filename is None:
+                    # The store sends no If-None-Match or If-Modified-Since, so there's nothing to keep
+                    raise requests.HTTPError(f"{response.status_code} Not Modified for an unconditional request",
+                                             response=response)
+                return 'skipped', 0, None
+            if response.status_code == 416 and offset:
+                # The part is already complete (or bogus); start over without the Range
+                os.remove(part)
+                return self._download(url, filename, part)
+            response.raise_for_status()
+            if response.status_code == 206 and _content_range_start(response) != offset:
+                if not offset:
+                    raise OSError("server sent part of the file without being asked for a range")
+                # Not the range asked for; start over without one rather than splice in the wrong bytes
+                os.remove(part)
+                return self._download(url, filename, part)
+            length = response.headers.get('Content-Length')
+            if response.headers.get('Content-Encoding', 'identity') != 'identity':
+                # requests decompresses the body, so its length won't match the header
+                length = None
+            if existing_size is not None and not validator and length is not None and int(length) == existing_size:
+                # Nothing to compare but the size, and that matches
+                _set_validator(filename, response_validator(response))
+                return 'skipped', 0, None
+
+            resumed = response.status_code == 206
+            digest = new_hash()
+            written = 0
+            with open(part, 'a+b' if resumed else 'wb') as out_file:
+                if resumed:
+                    # Hash what's already there, so the digest covers the whole file
+                    out_file.seek(0)
+                    for chunk in iter(lambda: out_file.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                else:
+                    _set_validator(part, response_validator(response))
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    out_file.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+            if length is not None and written != int(length):
+                raise OSError(f"connection closed after {written} of {length} bytes; the rest will be resumed")
+            if filename is not None:
+                # The validator xattr set on the part moves with it
+                os.replace(part, filename)
+            return ('resumed' if resumed else 'downloaded'), written, digest.hexdigest()
+
+    def close(self):
+        """Waits for the queued downloads and prints how the run went."""
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        seconds = time.perf_counter() - self.started
+        counts = {action: sum(result.action == action for result in self.results)
+                  for action in ('downloaded', 'resumed', 'skipped', 'failed')}
+        megabytes = sum(result.size for result in self.results) / (1024 * 1024)
+        print(', '.join(f"{count} {action}" for action, count in counts.items()) +
+              f": {megabytes:.1f} MB in {seconds:.1f}s ({megabytes / seconds if seconds else 0:.2f} MB/s)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,118 @@
+# #############################################################################
+# Description:  A content-addressed store for downloaded images.
+#
+#               Each distinct file is kept once, under objects/ by the hash of
+#               its bytes (computed while it downloads), and the names it was
+#               found under are hard links to that blob, or symlinks where a
+#               hard link can't be made. An index maps every URL to the hash
+#               it last resolved to, so a known URL is linked straight away
+#               without asking the server again.
+#
+# #############################################################################
+
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+INDEX_NAME = 'index.sqlite'
+
+def new_hash():
+    """The hash blobs are named by; the same as content_hash.full_hash, so digests can be compared."""
+    return hashlib.blake2b(digest_size=20)
+
+class ImageStore:
+    """Blobs under `root`/objects, named by digest, plus the URL -> digest index.
+
+    Safe to share between download threads: index updates and linking are
+    serialized, blobs are moved into place atomically.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.objects = os.path.join(self.root, 'objects')
+        self.parts = os.path.join(self.root, 'parts')
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.parts, exist_ok=True)
+        self.lock = threading.Lock()
+        self.added = 0
+        self.duplicates = 0
+        self.conn = sqlite3.connect(os.path.join(self.root, INDEX_NAME), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS url ("
+            " url TEXT PRIMARY KEY,"
+            " digest TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " added REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def blob_path(self, digest):
+        # Two levels of fan-out keep directories small on big stores
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def part_path(self, url):
+        """Where a download of `url` is written until it's complete; stable across runs so it can resume."""
+        return os.path.join(self.parts, hashlib.sha1(url.encode()).hexdigest() + '.part')
+
+    def lookup(self, url):
+        """Returns the digest `url` is known to hold, if its blob is still in the store."""
+        with self.lock:
+            row = self.conn.execute("SELECT digest FROM url WHERE url = ?", (url,)).fetchone()
+        if row is None or not os.path.isfile(self.blob_path(row[0])):
+            return None
+        return row[0]
+
+    def add(self, url, part, digest):
+        """Moves a completed download into the store (or drops it if the blob is already there) and indexes `url`."""
+        blob = self.blob_path(digest)
+        size = os.path.getsize(part)
+        with self.lock:
+            if os.path.isfile(blob):
+                os.remove(part)
+                self.duplicates += 1
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(part, blob)
+                self.added += 1
+            self.conn.execute(
+                "INSERT OR REPLACE INTO url (url, digest, size, added) VALUES (?, ?, ?, ?)",
+                (url, digest, size, time.time()),
+            )
+            self.conn.commit()
+
+    def link(self, digest, filename):
+        """Makes `filename` name the blob for `digest` and returns the name used.
+
+        A name already taken by a different file gets the digest added to it
+        (and then a counter), so images sharing a basename never overwrite one
+        another, and files the store didn't make are never touched.
+        """
+        blob = self.blob_path(digest)
+        stem, extension = os.path.splitext(filename)
+        names = itertools.chain((filename, f"{stem}-{digest[:8]}{extension}"),
+                                (f"{stem}-{digest[:8]}-{n}{extension}" for n in itertools.count(2)))
+        with self.lock:
+            for name in names:
+                if not os.path.lexists(name):
+                    break
+                if _same_file(name, blob):
+                    return name
+            try:
+                os.link(blob, name)
+            except OSError:
+                # Another filesystem, or one without hard links
+                os.symlink(os.path.relpath(blob, os.path.dirname(os.path.abspath(name))), name)
+            return name
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def _same_file(path, blob):
+    try:
+        return os.path.samefile(path, blob)
+    except OSError:
+        return False
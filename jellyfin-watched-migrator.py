@@ -11,18 +11,30 @@ import json
 import requests
 import sys
 import os
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from configobj import ConfigObj
+from library_items import compact_items
+from jellyfin_api import DEFAULT_POOL_SIZE, JellyfinClient, RateLimiter, load_config, server_timestamp
+from migration_state import DEFAULT_JOURNAL_PATH, DEFAULT_STATE_PATH, SYNC_OVERLAP, ProgressJournal, SyncCheckpoint
+from title_match import DEFAULT_THRESHOLD, TitleIndex
 
 # #############################################################################
 # CONFIGURATION: Set the username you want to sync here.
 # #############################################################################
 TARGET_USERNAME = "ben"
+# Number of PlayedItems POSTs in flight at once, and the cap on POSTs per
+# second sent to the destination server (0 = no cap). Both can be overridden
+# with --workers and --rate-limit.
+SYNC_WORKERS = 8
+SYNC_RATE_LIMIT = 0
+# Source items re-fetched per request when retrying ones a delta run couldn't sync
+PENDING_IDS_PER_REQUEST = 100
 # #############################################################################
 
 def getConfig(path, section, option):
-    """Reads a specific option from the config file."""
-    config = ConfigObj(path)
-    return config[section][option]
+    """Reads a specific option from the config file (parsed once per run)."""
+    return load_config(path)[section][option]
 
 def createConfig(path):
     """Creates a default settings.ini file if one doesn't exist."""
@@ -45,119 +57,244 @@ def createConfig(path):
     config.write()
     print("'settings.ini' created. Please edit it with your server details and API keys.")
 
-def get_user_id(urlbase, apikey, username):
+def get_user_id(client, username):
     """Fetches the User ID for a given username from a Jellyfin server."""
-    api_url = f"{urlbase}Users?api_key={apikey}"
-    headers = {'accept': 'application/json'}
     try:
-        response = requests.get(api_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        users = response.json()
-        for user in users:
-            if user['Name'].lower() == username.lower():
-                print(f"Found user '{username}' with ID: {user['Id']}")
-                return user['Id']
-        return None
+        user_id = client.get_user_id(username)
+        if user_id:
+            print(f"Found user '{username}' with ID: {user_id}")
+        return user_id
     except requests.exceptions.RequestException as e:
-        print(f"\033[91mError connecting to {urlbase}: {e}\033[00m")
+        print(f"\033[91mError connecting to {client.urlbase}: {e}\033[00m")
         return None
 
-def get_source_watched_status(urlbase, apikey, user_id):
-    """Gets all watched media for a user from the source server."""
-    print("\nFetching watched status from the SOURCE server...")
-    migration_data = []
-    api_url = f"{urlbase}Users/{user_id}/Items?Filters=IsPlayed&IncludeItemTypes=Movie,Episode&Recursive=True&Fields=ProviderIds&api_key={apikey}"
-    headers = {'accept': 'application/json'}
+def get_source_watched_status(client, user_id, played_since=None):
+    """Gets watched media for a user from the source server as LibraryItem records.
+
+    With `played_since`, only items whose user data changed after that time
+    are returned. Returns None if the items couldn't be fetched.
+    """
+    if played_since:
+        print(f"\nFetching items played since {played_since} from the SOURCE server...")
+    else:
+        print("\nFetching watched status from the SOURCE server...")
+    api_path = f"Users/{user_id}/Items"
+    params = {
+        'Filters': 'IsPlayed',
+        'IncludeItemTypes': 'Movie,Episode',
+        'Recursive': 'True',
+        'Fields': 'ProviderIds',
+    }
+    if played_since:
+        params['MinDateLastSavedForUser'] = played_since
     try:
-        response = requests.get(api_url, headers=headers, timeout=30)
-        response.raise_for_status()
-        items = response.json().get('Items', [])
-        for item in items:
-            media_info = {
-                'Type': item.get('Type'),
-                'Name': item.get('Name'),
-                'ProviderIds': item.get('ProviderIds', {})
-            }
-            migration_data.append(media_info)
+        migration_data = list(compact_items(client.iter_items(api_path, params, timeout=30)))
         print(f"\033[92mFound {len(migration_data)} watched items on the source server.\033[00m")
         return migration_data
     except requests.exceptions.RequestException as e:
         print(f"\033[91mError fetching watched items: {e}\033[00m")
-        return []
+        return None
 
-def find_item_in_destination(source_item, dest_library):
-    """Finds a corresponding item in the destination library using ProviderIds or Name."""
+def get_source_items_by_id(client, user_id, item_ids):
+    """Re-fetches watched items from the source server by Id, for items an earlier delta run couldn't sync.
+
+    Items no longer watched (or gone) aren't returned. Returns None if the
+    items couldn't be fetched.
+    """
+    print(f"Fetching {len(item_ids)} items left unsynced by the last run...")
+    api_path = f"Users/{user_id}/Items"
+    params = {
+        'Filters': 'IsPlayed',
+        'IncludeItemTypes': 'Movie,Episode',
+        'Recursive': 'True',
+        'Fields': 'ProviderIds',
+    }
+    item_ids = sorted(item_ids)
+    items = []
+    try:
+        for start in range(0, len(item_ids), PENDING_IDS_PER_REQUEST):
+            params['Ids'] = ','.join(item_ids[start:start + PENDING_IDS_PER_REQUEST])
+            items.extend(compact_items(client.iter_items(api_path, params, timeout=30)))
+        return items
+    except requests.exceptions.RequestException as e:
+        print(f"\033[91mError fetching unsynced items: {e}\033[00m")
+        return None
+
+def build_destination_index(dest_library, fuzzy_threshold=DEFAULT_THRESHOLD):
+    """Builds lookup tables over the destination library (any iterable of LibraryItems) for O(1) matching.
+
+    With a `fuzzy_threshold` (0 disables it), titles are also indexed for
+    fuzzy matching.
+    """
+    provider_index = {}
+    name_index = {}
+    title_index = TitleIndex(fuzzy_threshold) if fuzzy_threshold else None
+    played = set()
+    position = -1
+    for position, dest_item in enumerate(dest_library):
+        item_type = dest_item.type
+        # Keep the first occurrence of each key, and remember its position so that
+        # lookups return the same item the old linear scan would have found.
+        entry = (position, dest_item.id)
+        for prov_key, prov_id in dest_item.providers:
+            provider_index.setdefault((item_type, prov_key, prov_id), entry)
+        name_index.setdefault((item_type, dest_item.name), entry)
+        if title_index is not None:
+            title_index.add(dest_item, entry)
+        if dest_item.played:
+            played.add(dest_item.id)
+    return {'providers': provider_index, 'names': name_index, 'titles': title_index, 'played': played,
+            'size': position + 1}
+
+def find_item_in_destination(source_item, dest_index):
+    """Finds a corresponding item in the destination index using ProviderIds, Name, or a fuzzy title match."""
+    item_type = source_item.type
     # First, try matching by Provider IDs (most reliable)
-    for dest_item in dest_library:
-        if dest_item['Type'] != source_item['Type']:
-            continue
-        # Compare provider IDs
-        source_providers = source_item.get('ProviderIds', {})
-        dest_providers = dest_item.get('ProviderIds', {})
-        if not source_providers or not dest_providers:
-            continue
-        
-        for prov_key, prov_id in source_providers.items():
-            if dest_providers.get(prov_key) == prov_id:
-                return dest_item['Id']
+    provider_index = dest_index['providers']
+    matches = []
+    for prov_key, prov_id in source_item.providers:
+        match = provider_index.get((item_type, prov_key, prov_id))
+        if match:
+            matches.append(match)
+    if matches:
+        return min(matches)[1]
 
     # As a fallback, try matching by name
-    for dest_item in dest_library:
-        if dest_item['Type'] == source_item['Type'] and dest_item['Name'] == source_item['Name']:
-            return dest_item['Id']
-            
-    return None
-
-def sync_to_destination(urlbase, apikey, user_id, migration_data):
-    """Syncs the watched status to the destination server."""
+    match = dest_index['names'].get((item_type, source_item.name))
+    if match is None and dest_index['titles'] is not None:
+        # Then by normalized title, for names differing in case, punctuation or a year suffix
+        match = dest_index['titles'].match(source_item)
+    return match[1] if match else None
+
+def mark_item_played(client, user_id, item_id, rate_limiter):
+    """Marks a single destination item as played and returns the HTTP status code."""
+    rate_limiter.wait()
+    response = client.post(f"Users/{user_id}/PlayedItems/{item_id}", timeout=10)
+    return response.status_code
+
+def sync_to_destination(client, user_id, migration_data, workers=SYNC_WORKERS, rate_limit=SYNC_RATE_LIMIT,
+                        checkpoint=None, journal=None, fuzzy_threshold=DEFAULT_THRESHOLD):
+    """Syncs the watched status to the destination server.
+
+    Matched items are marked on a pool of `workers` threads sharing the
+    client's keep-alive session, with at most `rate_limit` POSTs per second
+    (0 = no cap). The client's pool should hold at least `workers` connections.
+    With a SyncCheckpoint, items it already holds are skipped, destination
+    items that are already played aren't re-marked, and every item that ends
+    up watched on the destination is recorded in it. With a ProgressJournal,
+    every successful mark is journaled and items it already lists are skipped.
+    Items matching nothing exactly are matched on titles at least
+    `fuzzy_threshold` similar (0 disables this).
+
+    Returns a dict of counts: ok, already, failed and skipped.
+    """
     print("\nStarting sync to the DESTINATION server...")
+    counts = {'ok': 0, 'already': 0, 'failed': 0, 'skipped': 0}
+    if checkpoint is not None:
+        unsynced = [item for item in migration_data if not checkpoint.is_synced(item)]
+        counts['already'] = len(migration_data) - len(unsynced)
+        if counts['already']:
+            print(f"Skipping {counts['already']} items already synced by an earlier run.")
+        migration_data = unsynced
+
+    rate_limiter = RateLimiter(rate_limit)
     
     # 1. Get the entire library from the destination server for matching
     print("Fetching full library from destination server (this may take a moment)...")
-    library_url = f"{urlbase}Users/{user_id}/Items?Recursive=True&IncludeItemTypes=Movie,Episode&Fields=ProviderIds&api_key={apikey}"
-    headers = {'accept': 'application/json'}
+    library_path = f"Users/{user_id}/Items"
+    params = {
+        'Recursive': 'True',
+        'IncludeItemTypes': 'Movie,Episode',
+        'Fields': 'ProviderIds',
+        'EnableUserData': 'true',
+    }
     try:
-        response = requests.get(library_url, headers=headers, timeout=60)
-        response.raise_for_status()
-        destination_library = response.json().get('Items', [])
-        print(f"Destination library has {len(destination_library)} items.")
+        # The index is built straight from the page stream; the raw library is never held.
+        destination_index = build_destination_index(compact_items(client.iter_items(library_path, params, timeout=60)),
+                                                    fuzzy_threshold)
+        print(f"Destination library has {destination_index['size']} items.")
     except requests.exceptions.RequestException as e:
         print(f"\033[91mCould not fetch destination library: {e}\033[00m")
-        return
+        counts['failed'] = len(migration_data)
+        return counts
 
-    # 2. Iterate and sync each item
-    ok_count = 0
-    nok_count = 0
+    # 2. Match each item and hand the marks to the worker pool
     total_items = len(migration_data)
-    
-    for i, source_item in enumerate(migration_data):
-        item_id = find_item_in_destination(source_item, destination_library)
-        
-        if item_id:
-            mark_watched_url = f"{urlbase}Users/{user_id}/PlayedItems/{item_id}?api_key={apikey}"
-            try:
-                post_response = requests.post(mark_watched_url, headers=headers, timeout=10)
-                if post_response.status_code == 200:
-                    ok_count += 1
-                    print(f"\033[92mOK ({i+1}/{total_items}): Marked '{source_item['Name']}' as watched.\033[00m")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        try:
+            for i, source_item in enumerate(migration_data):
+                item_id = find_item_in_destination(source_item, destination_index)
+                if item_id and journal is not None and item_id in journal.done_ids:
+                    counts['already'] += 1
+                    if checkpoint is not None:
+                        checkpoint.mark_synced(source_item)
+                    print(f"\033[96mDONE ({i+1}/{total_items}): '{source_item.name}' was marked by an interrupted run.\033[00m")
+                elif item_id and checkpoint is not None and item_id in destination_index['played']:
+                    counts['already'] += 1
+                    checkpoint.mark_synced(source_item)
+                    print(f"\033[96mDONE ({i+1}/{total_items}): '{source_item.name}' is already watched on destination server.\033[00m")
+                elif item_id:
+                    future = executor.submit(mark_item_played, client, user_id, item_id, rate_limiter)
+                    pending[future] = (i, source_item, item_id)
                 else:
-                    nok_count += 1
-                    print(f"\033[91mFAIL ({i+1}/{total_items}): Could not mark '{source_item['Name']}' as watched. Status: {post_response.status_code}\033[00m")
-            except requests.exceptions.RequestException as e:
-                nok_count += 1
-                print(f"\033[91mFAIL ({i+1}/{total_items}): Network error while marking '{source_item['Name']}' as watched: {e}\033[00m")
-        else:
-            nok_count += 1
-            print(f"\033[93mSKIP ({i+1}/{total_items}): Could not find matching item for '{source_item['Name']}' on destination server.\033[00m")
+                    counts['skipped'] += 1
+                    print(f"\033[93mSKIP ({i+1}/{total_items}): Could not find matching item for '{source_item.name}' on destination server.\033[00m")
+
+            # Results are tallied here on the main thread, so the counts need no locking.
+            for future in as_completed(pending):
+                i, source_item, item_id = pending[future]
+                try:
+                    status_code = future.result()
+                    if status_code == 200:
+                        counts['ok'] += 1
+                        if journal is not None:
+                            journal.record(item_id)
+                        if checkpoint is not None:
+                            checkpoint.mark_synced(source_item)
+                        print(f"\033[92mOK ({i+1}/{total_items}): Marked '{source_item.name}' as watched.\033[00m")
+                    else:
+                        counts['failed'] += 1
+                        print(f"\033[91mFAIL ({i+1}/{total_items}): Could not mark '{source_item.name}' as watched. Status: {status_code}\033[00m")
+                except requests.exceptions.RequestException as e:
+                    counts['failed'] += 1
+                    print(f"\033[91mFAIL ({i+1}/{total_items}): Network error while marking '{source_item.name}' as watched: {e}\033[00m")
+        except KeyboardInterrupt:
+            # Drop the queued marks so we stop promptly; the journal keeps what finished
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
     print("\n\n\033[95m##### Sync Complete #####\033[00m")
-    print(f"\033[92mSuccessfully synced: {ok_count}\033[00m")
-    print(f"\033[91mFailed or skipped: {nok_count}\033[00m")
+    print(f"\033[92mSuccessfully synced: {counts['ok']}\033[00m")
+    if counts['already']:
+        print(f"\033[96mAlready watched: {counts['already']}\033[00m")
+    print(f"\033[91mFailed or skipped: {counts['failed'] + counts['skipped']}\033[00m")
+    return counts
 
 
 if __name__ == "__main__":
     CONFIG_PATH = "settings.ini"
 
+    parser = ArgumentParser(description="Sync watched status from one Jellyfin server to another")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS,
+                        help=f"number of concurrent mark-as-played requests (default {SYNC_WORKERS})")
+    parser.add_argument("--rate-limit", type=float, default=SYNC_RATE_LIMIT,
+                        help="maximum mark-as-played requests per second, 0 for no cap")
+    parser.add_argument("--delta", action="store_true",
+                        help="only sync items played since the last run (and any it left unsynced), using a local checkpoint")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH,
+                        help=f"checkpoint file used by --delta (default {DEFAULT_STATE_PATH})")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip items an interrupted earlier run already marked")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help=f"progress journal used by --resume (default {DEFAULT_JOURNAL_PATH})")
+    parser.add_argument("--fuzzy-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"minimum title similarity (0-1) for fuzzy matches, 0 to disable (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--timings", action="store_true",
+                        help="print the time spent on each Jellyfin endpoint when done")
+    args = parser.parse_args()
+
     # Check if config file exists
     if not os.path.exists(CONFIG_PATH):
         createConfig(CONFIG_PATH)
@@ -169,25 +306,74 @@ if __name__ == "__main__":
         sys.exit()
 
     # --- SOURCE SERVER ---
-    source_url = getConfig(CONFIG_PATH, 'Jellyfin_Source', 'URLBASE')
-    source_api_key = getConfig(CONFIG_PATH, 'Jellyfin_Source', 'APIKEY')
-    source_user_id = get_user_id(source_url, source_api_key, TARGET_USERNAME)
+    workers = max(1, args.workers)
+    source_client = JellyfinClient.from_config(CONFIG_PATH, 'Jellyfin_Source')
+    source_user_id = get_user_id(source_client, TARGET_USERNAME)
     if not source_user_id:
         print(f"\033[91mCould not find user '{TARGET_USERNAME}' on the SOURCE server. Exiting.\033[00m")
         sys.exit()
         
-    migration_list = get_source_watched_status(source_url, source_api_key, source_user_id)
+    # --- DESTINATION SERVER ---
+    # One pooled connection per worker, so concurrent marks never wait on the pool
+    dest_client = JellyfinClient.from_config(CONFIG_PATH, 'Jellyfin_Destination',
+                                             pool_size=max(workers, DEFAULT_POOL_SIZE))
+
+    checkpoint = None
+    played_since = None
+    if args.delta:
+        checkpoint = SyncCheckpoint(args.state, source_client.urlbase, dest_client.urlbase, TARGET_USERNAME).load()
+        played_since = checkpoint.last_sync
+    # Taken before anything is fetched, so items played during this run are picked up next time
+    sync_started = server_timestamp(SYNC_OVERLAP)
+
+    migration_list = get_source_watched_status(source_client, source_user_id, played_since)
+    if migration_list is None:
+        sys.exit()
+    if checkpoint is not None and checkpoint.pending_ids:
+        # Items the last run skipped or failed to mark were played before its
+        # checkpoint, so they're fetched again by Id rather than by date
+        pending_ids = checkpoint.pending_ids - {item.id for item in migration_list}
+        pending_items = get_source_items_by_id(source_client, source_user_id, pending_ids) if pending_ids else []
+        if pending_items is None:
+            sys.exit()
+        migration_list += pending_items
     if not migration_list:
         print("No watched items to migrate. Exiting.")
+        if checkpoint is not None:
+            checkpoint.set_pending(migration_list)
+            checkpoint.last_sync = sync_started
+            checkpoint.save()
         sys.exit()
-        
-    # --- DESTINATION SERVER ---
-    dest_url = getConfig(CONFIG_PATH, 'Jellyfin_Destination', 'URLBASE')
-    dest_api_key = getConfig(CONFIG_PATH, 'Jellyfin_Destination', 'APIKEY')
-    dest_user_id = get_user_id(dest_url, dest_api_key, TARGET_USERNAME)
+
+    dest_user_id = get_user_id(dest_client, TARGET_USERNAME)
     if not dest_user_id:
         print(f"\033[91mCould not find user '{TARGET_USERNAME}' on the DESTINATION server. Exiting.\033[00m")
         sys.exit()
 
     # --- RUN SYNC ---
-    sync_to_destination(dest_url, dest_api_key, dest_user_id, migration_list)
\ No newline at end of file
+    journal = ProgressJournal(args.journal, dest_client.urlbase, TARGET_USERNAME).open(resume=args.resume)
+    if journal.done_ids:
+        print(f"Resuming: {len(journal.done_ids)} items were already marked by an interrupted run.")
+    counts = None
+    try:
+        counts = sync_to_destination(dest_client, dest_user_id, migration_list,
+                                     workers=workers, rate_limit=args.rate_limit,
+                                     checkpoint=checkpoint, journal=journal,
+                                     fuzzy_threshold=args.fuzzy_threshold)
+    finally:
+        # Keep the journal around for --resume unless every mark went through
+        journal.close(finished=counts is not None and not counts['failed'])
+    if checkpoint is not None:
+        # Items that failed or had no match on the destination are kept as
+        # pending and retried next run, so the checkpoint can always move on.
+        checkpoint.set_pending(migration_list)
+        checkpoint.last_sync = sync_started
+        checkpoint.save()
+
+    if args.timings:
+        print("\n\033[95m##### Request Timings #####\033[00m")
+        for client in (source_client, dest_client):
+            for endpoint, count, seconds in client.timing_report():
+                print(f"  {client.urlbase} {endpoint}: {count} requests, {seconds:.2f}s")
+    source_client.close()
+    dest_client.close()
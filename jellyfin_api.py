@@ -0,0 +1,195 @@
+# #############################################################################
+# Description:  Shared helpers for talking to the Jellyfin HTTP API from the
+#               jellyfin_* scripts in this repository.
+#
+# #############################################################################
+
+import datetime
+import functools
+import threading
+import time
+from collections import defaultdict
+import requests
+from configobj import ConfigObj
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Number of items requested per page when walking a library. Large enough to
+# keep the request count low, small enough that no single response is huge.
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30
+
+@functools.lru_cache(maxsize=None)
+def load_config(path):
+    """Parses a settings file once per process; later calls get the same ConfigObj."""
+    return ConfigObj(path)
+
+def server_timestamp(offset=datetime.timedelta(0)):
+    """Returns the current UTC time minus `offset`, formatted for date filters like MinDateLastSaved."""
+    moment = datetime.datetime.now(datetime.timezone.utc) - offset
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, retries=0, backoff=0.5):
+    """Creates a requests.Session whose keep-alive pool can serve `pool_size` threads at once.
+
+    With `retries`, connection errors and 429/5xx responses are retried with
+    exponential backoff starting at `backoff` seconds.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # Marking an item played is idempotent, so POSTs are safe to retry too
+        allowed_methods=frozenset({'GET', 'POST', 'DELETE'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class RateLimiter:
+    """Spaces calls out so that no more than `rate` happen per second across all threads.
+
+    A rate of 0 (or None) disables limiting.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        """Blocks until the caller's slot comes up."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def iter_items(api_url, params, page_size=DEFAULT_PAGE_SIZE, timeout=60, session=None):
+    """Yields items from a Jellyfin list endpoint one page at a time.
+
+    Pages are requested with StartIndex/Limit so the server never has to
+    serialise the whole library at once and only one page of raw JSON is held
+    in memory. Request errors are raised to the caller.
+    """
+    http = session or requests
+    headers = {'accept': 'application/json'}
+    page_params = dict(params)
+    # The total count forces an extra COUNT query on the server; we don't need it.
+    page_params['EnableTotalRecordCount'] = 'false'
+    page_params['Limit'] = page_size
+    start_index = 0
+    while True:
+        page_params['StartIndex'] = start_index
+        response = http.get(api_url, params=page_params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        items = response.json().get('Items', [])
+        yield from items
+        if len(items) < page_size:
+            return
+        start_index += len(items)
+
+class JellyfinClient:
+    """A pooled, retrying client for one Jellyfin server.
+
+    All requests share one keep-alive session with gzip enabled, the user list
+    is fetched at most once, and the time spent on each endpoint is tallied
+    so slow calls show up in timing_report().
+    """
+
+    def __init__(self, urlbase, apikey, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES,
+                 timeout=DEFAULT_TIMEOUT):
+        self.urlbase = urlbase if urlbase.endswith('/') else urlbase + '/'
+        self.apikey = apikey
+        self.timeout = timeout
+        self.session = create_session(pool_size=pool_size, retries=retries)
+        self.session.headers.update({'accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'})
+        self.session.params = {'api_key': apikey}
+        self.timings = defaultdict(lambda: [0, 0.0])
+        self.timings_lock = threading.Lock()
+        self._users = None
+
+    @classmethod
+    def from_config(cls, path, section, **kwargs):
+        """Creates a client from the URLBASE and APIKEY options of a settings file section."""
+        config = load_config(path)
+        return cls(config[section]['URLBASE'], config[section]['APIKEY'], **kwargs)
+
+    def url(self, path):
+        return self.urlbase + path.lstrip('/')
+
+    def request(self, method, path, **kwargs):
+        """Sends a request to `path` (relative to URLBASE) and returns the response."""
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        try:
+            return self.session.request(method, self.url(path), **kwargs)
+        finally:
+            self._record_timing(method, path, time.perf_counter() - started)
+
+    def get_json(self, path, params=None, timeout=None):
+        """GETs `path` and returns the decoded JSON body, raising on HTTP errors."""
+        response = self.request('GET', path, params=params, timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path, params=None, timeout=None):
+        return self.request('POST', path, params=params, timeout=timeout or self.timeout)
+
+    def iter_items(self, path, params, page_size=DEFAULT_PAGE_SIZE, timeout=None):
+        """Yields items from a list endpoint page by page; see iter_items()."""
+        return iter_items(self.url(path), params, page_size=page_size,
+                          timeout=timeout or self.timeout, session=_TimedSession(self, path))
+
+    def get_users(self):
+        """Returns the server's users, fetching them only on the first call."""
+        if self._users is None:
+            self._users = self.get_json('Users', timeout=10)
+        return self._users
+
+    def get_user_id(self, username):
+        """Returns the Id of the user called `username` (case-insensitive), or None."""
+        for user in self.get_users():
+            if user['Name'].lower() == username.lower():
+                return user['Id']
+        return None
+
+    def timing_report(self):
+        """Returns (endpoint, request count, total seconds) tuples, slowest first."""
+        with self.timings_lock:
+            rows = [(endpoint, count, seconds) for endpoint, (count, seconds) in self.timings.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def close(self):
+        self.session.close()
+
+    def _record_timing(self, method, path, seconds):
+        # Endpoint names are plain words; anything else in the path is an id
+        segments = path.split('?')[0].strip('/').split('/')
+        endpoint = f"{method} " + '/'.join(segment if segment.isalpha() else '{id}' for segment in segments)
+        with self.timings_lock:
+            entry = self.timings[endpoint]
+            entry[0] += 1
+            entry[1] += seconds
+
+class _TimedSession:
+    """Lets iter_items() page through the client's session while each page is timed."""
+
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        started = time.perf_counter()
+        try:
+            return self.client.session.get(url, params=params, headers=headers, timeout=timeout)
+        finally:
+            self.client._record_timing('GET', self.path, time.perf_counter() - started)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# #############################################################################
+# Description:  Benchmarks the Jellyfin scripts against jellyfin_mock_server.
+#
+#               For each library size a mock server is started in its own
+#               process and the fetch, grouping, matching and sync stages are
+#               run in another, reporting items/sec, peak RSS and the number
+#               of requests each stage sent.
+#
+# Usage:
+# python3 jellyfin_benchmark.py --sizes 1000,10000,100000,500000 --latency 0.002
+#
+# #############################################################################
+
+import contextlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import time
+from argparse import ArgumentParser
+
+from jellyfin_api import JellyfinClient
+from library_items import compact_items
+from jellyfin_mock_server import MockJellyfinServer, MockLibrary
+
+APIKEY = 'mock-api-key'
+DEFAULT_SIZES = '1000,10000,100000,500000'
+STAGES = ('fetch', 'grouping', 'matching', 'sync')
+
+def load_migrator():
+    """Imports jellyfin-watched-migrator.py, whose name isn't a valid module name."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jellyfin-watched-migrator.py')
+    spec = importlib.util.spec_from_file_location('jellyfin_watched_migrator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def serve(size, latency, ready):
+    server = MockJellyfinServer(('127.0.0.1', 0), MockLibrary(size), APIKEY, latency)
+    ready.put(server.urlbase)
+    server.serve_forever()
+
+def run_stages(urlbase, workers, sync_limit, results):
+    """Runs every stage against the server at `urlbase` and puts one row per stage on `results`."""
+    import jellyfin_find_duplicates
+    migrator = load_migrator()
+    client = JellyfinClient(urlbase, APIKEY, pool_size=max(workers, 10))
+
+    def request_count():
+        stats = client.get_json('_stats')
+        return sum(stats.values())
+
+    def timed(stage, func):
+        requests_before = request_count()
+        started = time.perf_counter()
+        # The scripts report progress on stdout; keep it out of the benchmark table
+        with contextlib.redirect_stdout(io.StringIO()):
+            items = func()
+        elapsed = time.perf_counter() - started
+        # The _stats call made by request_count() itself is left out
+        requests_sent = request_count() - requests_before - 1
+        results.put((stage, items, elapsed, peak_rss_mb(), requests_sent))
+
+    user_id = client.get_user_id('ben')
+    library = []
+
+    def fetch():
+        api_path, params = jellyfin_find_duplicates.item_query(user_id, 'Movie,Episode')
+        library.extend(compact_items(client.iter_items(api_path, params, timeout=120)))
+        return len(library)
+
+    def grouping():
+        movies = [item for item in library if item.type == 'Movie']
+        episodes = [item for item in library if item.type == 'Episode']
+        jellyfin_find_duplicates.find_duplicate_movies(movies)
+        jellyfin_find_duplicates.find_duplicate_episodes(episodes)
+        return len(library)
+
+    played = []
+
+    def matching():
+        played.extend(item for item in library if item.played)
+        index = migrator.build_destination_index(library)
+        for source_item in played:
+            migrator.find_item_in_destination(source_item, index)
+        return len(played)
+
+    def sync():
+        batch = played[:sync_limit]
+        migrator.sync_to_destination(client, user_id, batch, workers=workers)
+        return len(batch)
+
+    for stage, func in zip(STAGES, (fetch, grouping, matching, sync)):
+        timed(stage, func)
+    client.close()
+
+def benchmark(size, latency, workers, sync_limit):
+    """Benchmarks one library size and returns its rows."""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    server = context.Process(target=serve, args=(size, latency, ready), daemon=True)
+    server.start()
+    try:
+        urlbase = ready.get(timeout=30)
+        results = context.Queue()
+        worker = context.Process(target=run_stages, args=(urlbase, workers, sync_limit, results))
+        worker.start()
+        rows = []
+        while len(rows) < len(STAGES):
+            try:
+                rows.append(results.get(timeout=1))
+            except queue.Empty:
+                if not worker.is_alive():
+                    raise RuntimeError(f"benchmark of {size} items failed; see the traceback above")
+        worker.join()
+        return rows
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the Jellyfin scripts against a local mock server")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma separated library sizes (default {DEFAULT_SIZES})")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the mock server adds to each response")
+    parser.add_argument("--workers", type=int, default=8, help="sync worker threads")
+    parser.add_argument("--sync-limit", type=int, default=2000, help="most items marked played in the sync stage")
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'stage':<9} {'count':>8} {'seconds':>9} {'items/s':>11} {'peak RSS MB':>12} {'requests':>9}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        for stage, count, elapsed, rss, request_total in benchmark(size, args.latency, args.workers, args.sync_limit):
+            rate = count / elapsed if elapsed else 0
+            print(f"{size:>8} {stage:<9} {count:>8} {elapsed:>9.3f} {rate:>11.0f} {rss:>12.1f} {request_total:>9}")
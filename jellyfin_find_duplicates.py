@@ -10,10 +10,16 @@ import requests
 import os
 import sys
 from configobj import ConfigObj
-from collections import defaultdict
-import datetime
 from colorama import Fore, Style, init
-import subprocess
+from argparse import ArgumentParser
+import content_hash
+from duplicate_groups import EPISODE_STRATEGIES, KEY_STRATEGIES, MOVIE_STRATEGIES, find_groups
+from duplicate_report import (DEFAULT_KEEPER_POLICY, KEEPER_CRITERIA, CleanupWriter, batch_deletes,
+                              choose_keeper, describe_candidate, parse_policy)
+from jellyfin_api import JellyfinClient, load_config
+from library_items import compact_items
+from library_snapshot import DEFAULT_SNAPSHOT_PATH, LibrarySnapshot, snapshot_timestamp
+from media_probe import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, DEFAULT_PROBE_WORKERS, ProbeCache, probe_files
 
 # Initialize colorama for cross-platform colored terminal output
 init(autoreset=True)
@@ -25,9 +31,8 @@ OUTPUT_SCRIPT_PATH = "/tmp/jellyfin_duplicates_cleanup.sh"
 CONFIG_PATH = "settings.ini"
 
 def getConfig(path, section, option):
-    """Reads a specific option from the config file."""
-    config = ConfigObj(path)
-    return config[section][option]
+    """Reads a specific option from the config file (parsed once per run)."""
+    return load_config(path)[section][option]
 
 def createConfig(path):
     """Creates a default settings.ini file if one doesn't exist."""
@@ -44,180 +49,226 @@ def createConfig(path):
     config.write()
     print(f"{Fore.GREEN}'settings.ini' created. Please edit it with your server details and API key.{Style.RESET_ALL}")
 
-def get_items_from_server(urlbase, apikey, item_type):
-    """Fetches all items of a specific type (Movie, Episode) from a Jellyfin server."""
-    print(f"\n{Fore.CYAN}Fetching all {item_type.lower()}s from the server...{Style.RESET_ALL}")
-    all_items = []
-    # Fetching all items from the server. Using a user ID is required.
+def get_admin_user_id(client):
+    """Returns the ID of the first user on the server, or None if it can't be fetched."""
+    # Fetching items from the server requires a user ID.
     # The default user ID will work for this purpose as we're just querying the library.
     # A user with admin privileges is recommended for this API key.
-    
-    # First, get an admin user ID
-    api_url_users = f"{urlbase}Users?api_key={apikey}"
-    headers = {'accept': 'application/json'}
     try:
-        response = requests.get(api_url_users, headers=headers, timeout=10)
-        response.raise_for_status()
-        admin_user_id = response.json()[0]['Id']
+        return client.get_users()[0]['Id']
     except requests.exceptions.RequestException as e:
-        print(f"{Fore.RED}Error connecting to {urlbase} or fetching users: {e}{Style.RESET_ALL}")
-        return []
+        print(f"{Fore.RED}Error connecting to {client.urlbase} or fetching users: {e}{Style.RESET_ALL}")
     except IndexError:
         print(f"{Fore.RED}Could not find any users on the server.{Style.RESET_ALL}")
-        return []
+    return None
+
+def item_query(user_id, item_type, min_date_last_saved=None):
+    """Returns the Items path and parameters used to fetch one type of item."""
+    api_path = f"Users/{user_id}/Items"
+    params = {
+        'IncludeItemTypes': item_type,
+        'Recursive': 'True',
+        'Fields': 'ProviderIds,Path,SeriesName,SeasonName,EpisodeNumber',
+    }
+    if min_date_last_saved:
+        params['MinDateLastSaved'] = min_date_last_saved
+    return api_path, params
+
+def get_items_from_server(client, item_type):
+    """Streams all items of a specific type (Movie, Episode) from a Jellyfin server as LibraryItems."""
+    print(f"\n{Fore.CYAN}Fetching all {item_type.lower()}s from the server...{Style.RESET_ALL}")
+    admin_user_id = get_admin_user_id(client)
+    if not admin_user_id:
+        return
 
-    # Now, fetch the items using the admin user ID
-    api_url = f"{urlbase}Users/{admin_user_id}/Items?IncludeItemTypes={item_type}&Recursive=True&Fields=ProviderIds,Path,Overview,SeriesName,SeasonName,EpisodeNumber&api_key={apikey}"
+    # Now, page through the items using the admin user ID
+    api_path, params = item_query(admin_user_id, item_type)
+    item_count = 0
     try:
-        response = requests.get(api_url, headers=headers, timeout=60)
-        response.raise_for_status()
-        all_items = response.json().get('Items', [])
-        print(f"{Fore.GREEN}Found {len(all_items)} {item_type.lower()}s.{Style.RESET_ALL}")
-        return all_items
+        for item in compact_items(client.iter_items(api_path, params, timeout=60)):
+            item_count += 1
+            yield item
+        print(f"{Fore.GREEN}Found {item_count} {item_type.lower()}s.{Style.RESET_ALL}")
     except requests.exceptions.RequestException as e:
         print(f"{Fore.RED}Error fetching {item_type.lower()} items: {e}{Style.RESET_ALL}")
-        return []
 
-def find_duplicate_movies(movies):
-    """Finds duplicate movies by Provider ID or Name/Year."""
+def refresh_snapshot(snapshot, client, item_type):
+    """Brings the local snapshot of one item type up to date.
+
+    The first run fetches everything. Later runs only fetch items saved since
+    the last refresh, plus a bare list of Ids to drop items that were removed
+    from the server. Returns False, leaving the snapshot unchanged, on error.
+    """
+    admin_user_id = get_admin_user_id(client)
+    if not admin_user_id:
+        return False
+    started = snapshot_timestamp()
+    since = snapshot.last_refreshed(item_type)
+    try:
+        if since is None:
+            print(f"\n{Fore.CYAN}No snapshot of {item_type.lower()}s yet, fetching all of them...{Style.RESET_ALL}")
+            api_path, params = item_query(admin_user_id, item_type)
+            snapshot.replace(item_type, client.iter_items(api_path, params, timeout=60))
+        else:
+            print(f"\n{Fore.CYAN}Fetching {item_type.lower()}s changed since {since}...{Style.RESET_ALL}")
+            api_path, params = item_query(admin_user_id, item_type, min_date_last_saved=since)
+            changed = list(client.iter_items(api_path, params, timeout=60))
+            id_params = {
+                'IncludeItemTypes': item_type,
+                'Recursive': 'True',
+                'EnableImages': 'false',
+                'EnableUserData': 'false',
+            }
+            current_ids = {item['Id'] for item in client.iter_items(api_path, id_params, page_size=5000, timeout=60)}
+            updated, removed = snapshot.update(item_type, changed, current_ids)
+            print(f"{Fore.GREEN}{updated} {item_type.lower()}s changed, {removed} removed.{Style.RESET_ALL}")
+    except requests.exceptions.RequestException as e:
+        print(f"{Fore.RED}Error refreshing {item_type.lower()} snapshot: {e}{Style.RESET_ALL}")
+        return False
+    snapshot.mark_refreshed(item_type, started)
+    print(f"{Fore.GREEN}Snapshot holds {snapshot.count(item_type)} {item_type.lower()}s.{Style.RESET_ALL}")
+    return True
+
+def find_duplicate_movies(movies, strategies=MOVIE_STRATEGIES):
+    """Finds duplicate movies by any shared Provider ID, or Name/Year when they have none."""
     print(f"\n{Fore.CYAN}Searching for duplicate movies...{Style.RESET_ALL}")
-    duplicates = defaultdict(list)
-    
-    # Group by provider IDs first (most reliable)
-    for movie in movies:
-        providers = movie.get('ProviderIds', {})
-        found_id = False
-        for prov_key, prov_id in providers.items():
-            if prov_id:
-                duplicates[f"{prov_key}:{prov_id}"].append(movie)
-                found_id = True
-                break
-        
-        # If no provider ID, fall back to name and year
-        if not found_id:
-            name = movie.get('Name')
-            year = movie.get('ProductionYear')
-            if name and year:
-                duplicates[f"name:{name} ({year})"].append(movie)
-            elif name:
-                duplicates[f"name:{name}"].append(movie)
-
-    # Filter out non-duplicates
-    duplicate_movies = {key: items for key, items in duplicates.items() if len(items) > 1}
-    return duplicate_movies
-
-def find_duplicate_episodes(episodes):
+    return find_groups(movies, strategies)
+
+def find_duplicate_episodes(episodes, strategies=EPISODE_STRATEGIES):
     """Finds duplicate episodes by Series, Season, and Episode number."""
     print(f"\n{Fore.CYAN}Searching for duplicate TV show episodes...{Style.RESET_ALL}")
-    duplicates = defaultdict(list)
-    
-    for episode in episodes:
-        series_name = episode.get('SeriesName')
-        season_name = episode.get('SeasonName')
-        episode_number = episode.get('IndexNumber')
-        
-        if series_name and season_name and episode_number is not None:
-            # Create a unique key for each episode
-            key = f"{series_name} - {season_name} - E{episode_number:02d}"
-            duplicates[key].append(episode)
-            
-    # Filter out non-duplicates
-    duplicate_episodes = {key: items for key, items in duplicates.items() if len(items) > 1}
-    return duplicate_episodes
-
-def print_duplicates(duplicate_items):
-    """Prints the found duplicates in a human-readable format."""
+    return find_groups(episodes, strategies)
+
+def find_identical_items(items, hash_cache=None, workers=content_hash.DEFAULT_HASH_WORKERS):
+    """Finds items whose files are byte-identical, whatever their metadata says."""
+    items_by_path = {}
+    for item in items:
+        if item.path:
+            items_by_path.setdefault(item.path, item)
+    print(f"\n{Fore.CYAN}Comparing file contents of {len(items_by_path)} items...{Style.RESET_ALL}")
+    identical = content_hash.find_identical_files(items_by_path, hash_cache, workers)
+    return {f"blake2b:{digest}": [items_by_path[path] for path in paths] for digest, paths in identical.items()}
+
+def probe_duplicates(duplicate_items, probe_cache=None, workers=DEFAULT_PROBE_WORKERS):
+    """Probes every candidate file across all duplicate groups up front, in parallel."""
+    paths = [item.path for items in duplicate_items.values() for item in items]
+    print(f"\n{Fore.CYAN}Probing {len(paths)} candidate files...{Style.RESET_ALL}")
+    return probe_files(paths, probe_cache, workers)
+
+def print_duplicates(duplicate_items, writer, probe_cache=None, probe_workers=DEFAULT_PROBE_WORKERS,
+                     keeper_policy=None, preferred_formats=()):
+    """Prints the found duplicates and records them with a CleanupWriter.
+
+    All files are probed before any group is handled. If a ProbeCache is
+    given, ffprobe/mediainfo are only run for files that changed since they
+    were last probed. Without a `keeper_policy` the user is asked which file
+    to delete in each group; with one, the keeper is chosen by the policy and
+    every other copy is marked for deletion without prompting.
+
+    Returns the number of items with duplicates.
+    """
     total_duplicates_found = 0
     if not duplicate_items:
         print(f"{Fore.GREEN}No duplicates found.{Style.RESET_ALL}")
-        return
+        return 0
 
-    # Prepare for bash script output
-    with open(OUTPUT_SCRIPT_PATH, 'w') as f:
-        f.write("#!/bin/bash\n")
-        f.write("# This script was generated by jellyfin_find_duplicates.py\n")
-        f.write(f"# Generated on: {datetime.datetime.now()}\n")
-        f.write("# Review the commands before executing!\n\n")
+    probe_results = probe_duplicates(duplicate_items, probe_cache, probe_workers)
 
     for key, items in duplicate_items.items():
         total_duplicates_found += len(items)
+        candidates = [describe_candidate(item, probe_results.get(item.path)) for item in items]
+
+        if keeper_policy is not None:
+            keeper = choose_keeper(candidates, keeper_policy, preferred_formats)
+            # Files that couldn't be found, or that are the keeper's file under another entry, are left for review
+            deletes = batch_deletes(candidates, keeper)
+            writer.write_group(key, candidates, deletes, keeper)
+            print(f"{Fore.YELLOW}{key}{Style.RESET_ALL}: keeping {Fore.GREEN}{candidates[keeper]['path']}{Style.RESET_ALL}, "
+                  f"deleting {len(deletes)}")
+            continue
+
         print(f"\n{Fore.YELLOW}Duplicate ID: {key}{Style.RESET_ALL}")
-        for item in items:
-            name = item.get('Name') # type: ignore
-            path = item.get('Path') # type: ignore
-            size_mb = round(item.get('Size', 0) / (1024 * 1024), 2) # type: ignore
-            print(f"  - {Fore.WHITE}{name}{Style.RESET_ALL}")
-            print(f"    {Fore.LIGHTBLACK_EX}Path: {path}{Style.RESET_ALL}") # type: ignore
-            print(f"    {Fore.LIGHTBLACK_EX}Size: {size_mb} MB{Style.RESET_ALL}") # type: ignore
-            
-            # Add a commented-out rm command to the bash script
-            # Gather file info
-            file_info = {}
-            if path and os.path.exists(path):
-                try:
-                    stat = os.stat(path)
-                    file_info['size_mb'] = round(stat.st_size / (1024 * 1024), 2)
-                    file_info['modified'] = datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                except Exception as e:
-                    file_info['size_mb'] = size_mb
-                    file_info['modified'] = "Unknown"
-            else:
-                file_info['size_mb'] = size_mb
-                file_info['modified'] = "Unknown"
-
-            # Try to get media info using ffprobe or mediainfo
-            media_info = "Unknown"
-            if path and os.path.exists(path):
-                try:
-                    # Try ffprobe first
-                    ffprobe_cmd = [
-                        "ffprobe", "-v", "error", "-show_entries",
-                        "format=format_name", "-of", "default=noprint_wrappers=1:nokey=1", path
-                    ]
-                    result = subprocess.run(ffprobe_cmd, capture_output=True, text=True)
-                    if result.returncode == 0 and result.stdout.strip():
-                        media_info = result.stdout.strip()
-                    else:
-                        # Try mediainfo if ffprobe fails
-                        mediainfo_cmd = ["mediainfo", "--Inform=General;%Format%", path]
-                        result = subprocess.run(mediainfo_cmd, capture_output=True, text=True)
-                        if result.returncode == 0 and result.stdout.strip():
-                            media_info = result.stdout.strip()
-                except Exception:
-                    media_info = "Unknown"
-
-            print(f"    {Fore.YELLOW}Size: {file_info['size_mb']} MB{Style.RESET_ALL}")
-            print(f"    {Fore.YELLOW}Modified: {file_info['modified']}{Style.RESET_ALL}")
-            print(f"    {Fore.YELLOW}Format: {media_info}{Style.RESET_ALL}")
-
-            # Add a commented-out rm command to the bash script
-            with open(OUTPUT_SCRIPT_PATH, 'a') as f:
-                f.write(f"# rm \"{path}\" # {name} (Size: {file_info['size_mb']} MB, Modified: {file_info['modified']}, Format: {media_info})\n") # type: ignore
+        for item, candidate in zip(items, candidates):
+            size_mb = round((item.size or 0) / (1024 * 1024), 2)
+            print(f"  - {Fore.WHITE}{candidate['name']}{Style.RESET_ALL}")
+            print(f"    {Fore.LIGHTBLACK_EX}Path: {candidate['path']}{Style.RESET_ALL}")
+            print(f"    {Fore.LIGHTBLACK_EX}Size: {size_mb} MB{Style.RESET_ALL}")
+            print(f"    {Fore.YELLOW}Size: {candidate['size_mb']} MB{Style.RESET_ALL}")
+            print(f"    {Fore.YELLOW}Modified: {candidate['modified']}{Style.RESET_ALL}")
+            print(f"    {Fore.YELLOW}Format: {candidate['format']}{Style.RESET_ALL}")
 
         # Prompt user to pick which file to delete
         print(f"\n{Fore.CYAN}Which file would you like to delete for duplicate '{key}'? Enter the number (or press Enter to skip):{Style.RESET_ALL}")
-        for idx, item in enumerate(items):
-            name = item.get('Name')
-            path = item.get('Path') # type: ignore
-            print(f"  [{idx+1}] {name} - {Fore.GREEN}{path}{Style.RESET_ALL}")
+        for idx, candidate in enumerate(candidates):
+            print(f"  [{idx+1}] {candidate['name']} - {Fore.GREEN}{candidate['path']}{Style.RESET_ALL}")
         choice = input("Delete file number: ").strip()
+        deletes = []
         if choice.isdigit():
             idx = int(choice) - 1
-            if 0 <= idx < len(items):
-                path_to_delete = items[idx].get('Path')
-                with open(OUTPUT_SCRIPT_PATH, 'a') as f:
-                    f.write(f"rm \"{path_to_delete}\"\n")
-                print(f"{Fore.RED}Added delete command for: {path_to_delete}{Style.RESET_ALL}")
+            if 0 <= idx < len(items) and candidates[idx]['path']:
+                deletes.append(idx)
+                print(f"{Fore.RED}Added delete command for: {candidates[idx]['path']}{Style.RESET_ALL}")
             else:
                 print(f"{Fore.YELLOW}Invalid selection. Skipping.{Style.RESET_ALL}")
         else:
             print(f"{Fore.YELLOW}No file selected for deletion. Skipping.{Style.RESET_ALL}")
+        writer.write_group(key, candidates, deletes)
 
-    print(f"\n\n{Fore.MAGENTA}##### Duplicate Check Complete #####{Style.RESET_ALL}")
-    print(f"{Fore.RED}Found {total_duplicates_found} items with duplicates.{Style.RESET_ALL}")
-    print(f"{Fore.BLUE}A cleanup script has been generated at: {OUTPUT_SCRIPT_PATH}{Style.RESET_ALL}")
+    return total_duplicates_found
 
 if __name__ == "__main__":
+    parser = ArgumentParser(description="Find duplicate movies and episodes on a Jellyfin server")
+    parser.add_argument("--probe-cache", default=DEFAULT_CACHE_PATH,
+                        help=f"ffprobe/mediainfo result cache (default {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--probe-cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="maximum number of cached probe results")
+    parser.add_argument("--probe-workers", type=int, default=DEFAULT_PROBE_WORKERS,
+                        help=f"files probed concurrently (default {DEFAULT_PROBE_WORKERS})")
+    parser.add_argument("--no-probe-cache", action="store_true",
+                        help="probe every file and leave the cache untouched")
+    parser.add_argument("--refresh-probe-cache", action="store_true",
+                        help="discard all cached probe results before running")
+    parser.add_argument("--mode", choices=["metadata", "content"], default="metadata",
+                        help="group by Jellyfin metadata, or by identical file contents")
+    parser.add_argument("--hash-cache", default=content_hash.DEFAULT_CACHE_PATH,
+                        help=f"content hash cache for --mode content (default {content_hash.DEFAULT_CACHE_PATH})")
+    parser.add_argument("--hash-workers", type=int, default=content_hash.DEFAULT_HASH_WORKERS,
+                        help=f"files hashed concurrently (default {content_hash.DEFAULT_HASH_WORKERS})")
+    parser.add_argument("--refresh-hash-cache", action="store_true",
+                        help="discard all cached content hashes before running")
+    parser.add_argument("--group-by", type=lambda value: tuple(value.split(',')),
+                        help=f"comma separated grouping strategies for both movies and episodes, from "
+                             f"{', '.join(KEY_STRATEGIES)} (default {','.join(MOVIE_STRATEGIES)} for movies, "
+                             f"{','.join(EPISODE_STRATEGIES)} for episodes)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep a local library snapshot and only fetch items changed since the last run")
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_PATH,
+                        help=f"library snapshot used by --incremental (default {DEFAULT_SNAPSHOT_PATH})")
+    parser.add_argument("--batch", action="store_true",
+                        help="don't prompt; keep one file per group chosen by --keep and mark the rest for deletion")
+    parser.add_argument("--keep", default=','.join(DEFAULT_KEEPER_POLICY),
+                        help=f"comma separated keeper criteria for --batch, from {', '.join(KEEPER_CRITERIA)}, "
+                             f"applied in order (default {','.join(DEFAULT_KEEPER_POLICY)})")
+    parser.add_argument("--prefer-formats", default="",
+                        help="comma separated container formats the 'format' criterion prefers, best first "
+                             "(e.g. matroska,mp4)")
+    parser.add_argument("--output", default=OUTPUT_SCRIPT_PATH,
+                        help=f"cleanup script to write (default {OUTPUT_SCRIPT_PATH})")
+    parser.add_argument("--json", help="also write the duplicate groups to this JSON file")
+    parser.add_argument("--csv", help="also write the duplicate groups to this CSV file")
+    parser.add_argument("--timings", action="store_true",
+                        help="print the time spent on each Jellyfin endpoint when done")
+    args = parser.parse_args()
+    keeper_policy = None
+    if args.batch:
+        try:
+            keeper_policy = parse_policy(args.keep)
+        except ValueError as e:
+            parser.error(str(e))
+    preferred_formats = tuple(fmt.strip() for fmt in args.prefer_formats.split(',') if fmt.strip())
+    if args.group_by and not set(args.group_by) <= set(KEY_STRATEGIES):
+        parser.error(f"--group-by must be a comma separated list of: {', '.join(KEY_STRATEGIES)}")
+
     # Check if config file exists
     if not os.path.exists(CONFIG_PATH):
         createConfig(CONFIG_PATH)
@@ -233,15 +284,60 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"{Fore.RED}Error reading server configuration: {e}{Style.RESET_ALL}")
         sys.exit()
+    client = JellyfinClient(urlbase, apikey)
         
-    # Find duplicate movies
-    movies = get_items_from_server(urlbase, apikey, 'Movie')
-    if movies:
-        duplicate_movies = find_duplicate_movies(movies)
-        print_duplicates(duplicate_movies)
-
-    # Find duplicate TV episodes
-    episodes = get_items_from_server(urlbase, apikey, 'Episode')
-    if episodes:
-        duplicate_episodes = find_duplicate_episodes(episodes)
-        print_duplicates(duplicate_episodes)
\ No newline at end of file
+    probe_cache = None
+    if not args.no_probe_cache:
+        probe_cache = ProbeCache(args.probe_cache, max_entries=args.probe_cache_size)
+        if args.refresh_probe_cache:
+            probe_cache.clear()
+
+    hash_cache = None
+    if args.mode == "content":
+        hash_cache = content_hash.HashCache(args.hash_cache)
+        if args.refresh_hash_cache:
+            hash_cache.clear()
+
+    snapshot = None
+    if args.incremental:
+        snapshot = LibrarySnapshot(args.snapshot, client.urlbase).load()
+
+    writer = CleanupWriter(args.output, args.json, args.csv)
+    total_duplicates_found = 0
+    try:
+        # Find duplicate movies, then duplicate TV episodes
+        for item_type, find_duplicates in (('Movie', find_duplicate_movies), ('Episode', find_duplicate_episodes)):
+            if snapshot is not None:
+                if not refresh_snapshot(snapshot, client, item_type):
+                    continue
+                snapshot.save()
+                items = snapshot.items(item_type)
+            else:
+                items = get_items_from_server(client, item_type)
+
+            if args.mode == "content":
+                duplicate_items = find_identical_items(items, hash_cache, args.hash_workers)
+            elif args.group_by:
+                duplicate_items = find_duplicates(items, args.group_by)
+            else:
+                duplicate_items = find_duplicates(items)
+            total_duplicates_found += print_duplicates(duplicate_items, writer, probe_cache, args.probe_workers,
+                                                       keeper_policy, preferred_formats)
+    finally:
+        writer.close()
+        client.close()
+        if args.timings:
+            print(f"\n{Fore.MAGENTA}##### Request Timings #####{Style.RESET_ALL}")
+            for endpoint, count, seconds in client.timing_report():
+                print(f"  {endpoint}: {count} requests, {seconds:.2f}s")
+        if probe_cache is not None:
+            probe_cache.close()
+        if hash_cache is not None:
+            hash_cache.close()
+
+    print(f"\n\n{Fore.MAGENTA}##### Duplicate Check Complete #####{Style.RESET_ALL}")
+    print(f"{Fore.RED}Found {total_duplicates_found} items with duplicates.{Style.RESET_ALL}")
+    print(f"{Fore.BLUE}A cleanup script has been generated at: {args.output}{Style.RESET_ALL}")
+    for report_path in (args.json, args.csv):
+        if report_path:
+            print(f"{Fore.BLUE}Report written to: {report_path}{Style.RESET_ALL}")
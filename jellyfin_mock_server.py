@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# #############################################################################
+# Description:  A local stand-in for a Jellyfin server, serving a synthetic
+#               library of any size so the jellyfin_* scripts can be run and
+#               benchmarked without a real server.
+#
+#               Implements /Users, /Users/{id}/Items and /Items (paging,
+#               IncludeItemTypes, Ids, Filters=IsPlayed, MinDateLastSaved
+#               and MinDateLastSavedForUser) and POST /Users/{id}/PlayedItems/{id}.
+#               GET /_stats returns request counts per endpoint.
+#
+# Usage:
+# python3 jellyfin_mock_server.py --items 100000 --latency 0.005 --port 8096
+# then point URLBASE in settings.ini at http://127.0.0.1:8096/
+#
+# #############################################################################
+
+import datetime
+import gzip
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MOCK_USER = {'Name': 'ben', 'Id': '6f1c2a8e9b0d4c3fa1e2b3c4d5e6f708'}
+# Items are "saved" one second apart starting here, so date filters map onto index ranges.
+EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+class MockLibrary:
+    """A synthetic library whose items are computed from their index on demand.
+
+    The first `movie_share` of the items are movies and the rest episodes.
+    Every `played_every`-th item is played, and every `duplicate_every`-th
+    item copies the grouping metadata of the item before it, so the
+    duplicate finder has something to find. Nothing is held per item except
+    the ids marked played through PlayedItems.
+    """
+
+    def __init__(self, size, movie_share=0.2, played_every=4, duplicate_every=50):
+        self.size = size
+        self.movie_count = int(size * movie_share)
+        self.played_every = played_every
+        self.duplicate_every = duplicate_every
+        self.marked = set()
+        self.lock = threading.Lock()
+
+    def item_id(self, index):
+        return f"{index:032x}"
+
+    def index_of(self, item_id):
+        return int(item_id, 16)
+
+    def type_range(self, types):
+        """Returns the (start, stop) index range holding the requested item types."""
+        types = set(types or ('Movie', 'Episode'))
+        start = 0 if 'Movie' in types else self.movie_count
+        stop = self.size if 'Episode' in types else self.movie_count
+        return start, max(start, stop)
+
+    def query(self, types=None, played_only=False, min_saved=None, start_index=0, limit=None, ids=None):
+        """Returns (indexes for the page, total matching count)."""
+        start, stop = self.type_range(types)
+        if min_saved is not None:
+            start = max(start, int((min_saved - EPOCH).total_seconds()))
+        if played_only:
+            # Played items are the multiples of played_every within the range
+            first = -(-start // self.played_every) * self.played_every
+            candidates = range(first, stop, self.played_every) if first < stop else range(0)
+        else:
+            candidates = range(start, stop)
+        if ids is not None:
+            candidates = sorted({index for index in map(self.index_of, ids) if index in candidates})
+        total = len(candidates)
+        end = total if limit is None else min(total, start_index + limit)
+        return candidates[start_index:end], total
+
+    def item(self, index):
+        base = index - 1 if index % self.duplicate_every == 1 else index
+        saved = (EPOCH + datetime.timedelta(seconds=index)).strftime('%Y-%m-%dT%H:%M:%S.0000000Z')
+        with self.lock:
+            played = index % self.played_every == 0 or self.item_id(index) in self.marked
+        item = {
+            'Id': self.item_id(index),
+            'Overview': f"Synthetic item {index} served by jellyfin_mock_server.",
+            'DateCreated': saved,
+            'UserData': {'Played': played, 'PlayCount': int(played)},
+            'Size': 700 * 1024 * 1024 + index,
+        }
+        if index < self.movie_count:
+            item.update({
+                'Type': 'Movie',
+                'Name': f"Movie {base}",
+                'ProductionYear': 1950 + base % 70,
+                'ProviderIds': {'Tmdb': str(100000 + base), 'Imdb': f"tt{base:07d}"},
+                'Path': f"/media/movies/Movie {base}/Movie {base} ({index}).mkv",
+            })
+        else:
+            series, episode = divmod(base - self.movie_count, 100)
+            item.update({
+                'Type': 'Episode',
+                'Name': f"Episode {episode}",
+                'SeriesName': f"Series {series}",
+                'SeasonName': f"Season {episode // 10 + 1}",
+                'IndexNumber': episode % 10 + 1,
+                'ProviderIds': {'Tvdb': str(5000000 + base)},
+                'Path': f"/media/shows/Series {series}/S{episode // 10 + 1:02d}E{episode % 10 + 1:02d} ({index}).mkv",
+            })
+        return item
+
+    def mark_played(self, item_id):
+        with self.lock:
+            self.marked.add(item_id)
+
+def _parse_date(value):
+    if not value:
+        return None
+    return datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+
+class MockJellyfinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle and
+    # delayed ACKs add ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        segments = [segment for segment in url.path.split('/') if segment]
+        endpoint = method + ' /' + '/'.join(segment if segment.isalpha() else '{id}' for segment in segments)
+        if url.path == '/_stats':
+            endpoint = 'GET /_stats'
+        server.count_request(endpoint)
+        if server.latency:
+            time.sleep(server.latency)
+
+        if endpoint == 'GET /_stats':
+            return self._send_json(200, server.stats())
+        if query.get('api_key') != server.apikey and self.headers.get('X-Emby-Token') != server.apikey:
+            return self._send_json(401, {'error': 'Unauthorized'})
+        if endpoint == 'GET /Users':
+            return self._send_json(200, [MOCK_USER])
+        if endpoint in ('GET /Users/{id}/Items', 'GET /Items'):
+            return self._send_items(query)
+        if endpoint == 'POST /Users/{id}/PlayedItems/{id}':
+            server.library.mark_played(segments[-1])
+            return self._send_json(200, {'Played': True})
+        return self._send_json(404, {'error': 'Not found'})
+
+    def _send_items(self, query):
+        library = self.server.library
+        types = [item_type for item_type in query.get('IncludeItemTypes', '').split(',') if item_type]
+        played_only = 'IsPlayed' in query.get('Filters', '').split(',')
+        min_saved = _parse_date(query.get('MinDateLastSaved') or query.get('MinDateLastSavedForUser'))
+        start_index = int(query.get('StartIndex', 0))
+        limit = int(query['Limit']) if 'Limit' in query else None
+        ids = [item_id for item_id in query['Ids'].split(',') if item_id] if 'Ids' in query else None
+        indexes, total = library.query(types, played_only, min_saved, start_index, limit, ids)
+        body = {'Items': [library.item(index) for index in indexes], 'StartIndex': start_index}
+        if query.get('EnableTotalRecordCount', 'true').lower() != 'false':
+            body['TotalRecordCount'] = total
+        self._send_json(200, body)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload, compresslevel=1)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class MockJellyfinServer(ThreadingHTTPServer):
+    """The HTTP server; request counts per endpoint are kept in `request_counts`."""
+
+    daemon_threads = True
+
+    def __init__(self, address, library, apikey='mock-api-key', latency=0.0):
+        super().__init__(address, MockJellyfinHandler)
+        self.library = library
+        self.apikey = apikey
+        self.latency = latency
+        self.request_counts = Counter()
+        self.counts_lock = threading.Lock()
+
+    @property
+    def urlbase(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def count_request(self, endpoint):
+        with self.counts_lock:
+            self.request_counts[endpoint] += 1
+
+    def stats(self):
+        with self.counts_lock:
+            return dict(self.request_counts)
+
+def start_mock_server(size, port=0, latency=0.0, apikey='mock-api-key', **library_options):
+    """Starts a mock server on a background thread and returns it; call shutdown() to stop."""
+    server = MockJellyfinServer(('127.0.0.1', port), MockLibrary(size, **library_options), apikey, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Serve a synthetic Jellyfin library for testing and benchmarks")
+    parser.add_argument("--items", type=int, default=10000, help="number of items in the library")
+    parser.add_argument("--port", type=int, default=8096, help="port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--apikey", default="mock-api-key", help="API key clients must send")
+    args = parser.parse_args()
+
+    server = MockJellyfinServer(('127.0.0.1', args.port), MockLibrary(args.items), args.apikey, args.latency)
+    print(f"Serving {args.items} items at {server.urlbase} (API key '{args.apikey}')")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,6 +1,7 @@
 import requests
 import os
 from collections import defaultdict
+from jellyfin_api import JellyfinClient
 
 def get_env_var_or_raise(var_name):
     """Gets an environment variable or raises an error if it's not set."""
@@ -29,21 +30,21 @@ def filter_movies_with_multiple_paths(movies):
     return filtered_movies
 
 # Example: Get a list of all movies with full path and filter
-endpoint = "/Items"
+client = JellyfinClient(BASE_URL, API_KEY)
+endpoint = "Items"
 params = {
-    "api_key": API_KEY,
     "IncludeItemTypes": "Movie",
     "Recursive": "true",
     "Fields": "Path"
 }
 
-response = requests.get(BASE_URL + endpoint, params=params)
-
-if response.status_code == 200:
-    all_movies = response.json()["Items"]
+try:
+    # Page through the library rather than pulling it in a single request
+    all_movies = list(client.iter_items(endpoint, params))
+except requests.exceptions.RequestException as e:
+    print(f"Error fetching data: {e}")
+else:
     movies_with_multiple_paths = filter_movies_with_multiple_paths(all_movies)
 
     for movie in movies_with_multiple_paths:
         print(f"Title: {movie['Name']}, Year: {movie.get('ProductionYear')}, Path: {movie.get('Path')}")
-else:
-    print(f"Error fetching data: {response.status_code}")
\ No newline at end of file
@@ -1,7 +1,6 @@
-from jellyfin_apiclient_python import JellyfinClient
+from jellyfin_api import JellyfinClient
 
-client = JellyfinClient()
+client = JellyfinClient.from_config('settings.ini', 'Jellyfin_Server')
 
-client.config.data["app.name"] = 'pyfin'
-client.config.data["app.version"] = '0.0.1'
-client.authenticate({"Servers": [{"AccessToken": "ef62460ed3d84110be1f36fa895b58d9", "address": "192.168.128.70:8096" }]}, discover=False)
+for user in client.get_users():
+    print(f"{user['Name']}: {user['Id']}")
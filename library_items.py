@@ -0,0 +1,90 @@
+# #############################################################################
+# Description:  Compact records for Jellyfin library items, so the jellyfin_*
+#               scripts can hold hundreds of thousands of items without
+#               keeping every JSON dict the server sent.
+#
+# #############################################################################
+
+import sys
+
+class LibraryItem:
+    """One library item, reduced to the fields the scripts use.
+
+    Records use __slots__ rather than a per-instance dict, and strings that
+    repeat across the library (types, series and season names, provider
+    keys) are interned so every item shares a single copy. Provider ids are
+    kept as a tuple of (key, id) pairs. Fields a command didn't request are
+    None.
+    """
+
+    __slots__ = ('id', 'type', 'name', 'path', 'size', 'year', 'series', 'season',
+                 'episode', 'created', 'providers', 'played')
+
+    def __init__(self, id, type, name=None, path=None, size=None, year=None, series=None, season=None,
+                 episode=None, created=None, providers=(), played=False):
+        self.id = id
+        self.type = type
+        self.name = name
+        self.path = path
+        self.size = size
+        self.year = year
+        self.series = series
+        self.season = season
+        self.episode = episode
+        self.created = created
+        self.providers = providers
+        self.played = played
+
+    @classmethod
+    def from_api(cls, item):
+        """Builds a record from an item as returned by the Items API (or saved by to_api)."""
+        providers = tuple(
+            (sys.intern(prov_key), prov_id)
+            for prov_key, prov_id in (item.get('ProviderIds') or {}).items() if prov_id
+        )
+        return cls(
+            id=item.get('Id'),
+            type=_intern(item.get('Type')),
+            name=item.get('Name'),
+            path=item.get('Path'),
+            size=item.get('Size'),
+            year=item.get('ProductionYear'),
+            series=_intern(item.get('SeriesName')),
+            season=_intern(item.get('SeasonName')),
+            episode=item.get('IndexNumber'),
+            created=item.get('DateCreated'),
+            providers=providers,
+            played=bool((item.get('UserData') or {}).get('Played')),
+        )
+
+    def to_api(self):
+        """Returns the record as an Items API style dict, leaving out fields that are unset."""
+        fields = {
+            'Id': self.id,
+            'Type': self.type,
+            'Name': self.name,
+            'Path': self.path,
+            'Size': self.size,
+            'ProductionYear': self.year,
+            'SeriesName': self.series,
+            'SeasonName': self.season,
+            'IndexNumber': self.episode,
+            'DateCreated': self.created,
+        }
+        item = {field: value for field, value in fields.items() if value is not None}
+        if self.providers:
+            item['ProviderIds'] = dict(self.providers)
+        if self.played:
+            item['UserData'] = {'Played': True}
+        return item
+
+    def __repr__(self):
+        return f"LibraryItem({self.type} {self.id} {self.name!r})"
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def compact_items(items):
+    """Turns a stream of Items API dicts into LibraryItem records as they arrive."""
+    for item in items:
+        yield LibraryItem.from_api(item)
@@ -0,0 +1,114 @@
+# #############################################################################
+# Description:  A local snapshot of a Jellyfin library, so the duplicate finder
+#               can fetch only what changed since its last run. Duplicates are
+#               then grouped from the snapshot's items the same way as after a
+#               full fetch.
+#
+# #############################################################################
+
+import datetime
+import json
+import os
+from jellyfin_api import server_timestamp
+from library_items import LibraryItem
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pympv", "library_snapshot.json")
+SNAPSHOT_VERSION = 1
+# Refreshes ask for changes a little before the previous refresh started, so
+# clock skew between us and the server can't make us miss an update.
+REFRESH_OVERLAP = datetime.timedelta(minutes=10)
+
+def snapshot_timestamp():
+    """Returns the current UTC time, less REFRESH_OVERLAP, in the form Jellyfin expects."""
+    return server_timestamp(REFRESH_OVERLAP)
+
+class LibrarySnapshot:
+    """LibraryItem records per type, keyed on Id, with when each type was last refreshed."""
+
+    def __init__(self, path, server):
+        self.path = path
+        self.server = server
+        self.types = {}
+
+    def load(self):
+        """Reads the snapshot from disk, ignoring it if it belongs to another server."""
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return self
+        if data.get('version') != SNAPSHOT_VERSION or data.get('server') != self.server:
+            return self
+        for item_type, stored in data.get('types', {}).items():
+            entry = self._entry(item_type)
+            entry['refreshed'] = stored.get('refreshed')
+            for item in stored.get('items', []):
+                self._add(entry, item)
+        return self
+
+    def save(self):
+        """Writes the snapshot atomically, so an interrupted save never corrupts it."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'server': self.server,
+            'types': {
+                item_type: {
+                    'refreshed': entry['refreshed'],
+                    'items': [item.to_api() for item in entry['items'].values()],
+                }
+                for item_type, entry in self.types.items()
+            },
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            json.dump(data, fp, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+    def last_refreshed(self, item_type):
+        """Returns the MinDateLastSaved to use for the next refresh, or None if never refreshed."""
+        return self.types.get(item_type, {}).get('refreshed')
+
+    def mark_refreshed(self, item_type, timestamp):
+        self._entry(item_type)['refreshed'] = timestamp
+
+    def count(self, item_type):
+        return len(self.types.get(item_type, {}).get('items', {}))
+
+    def items(self, item_type):
+        """Returns the snapshot's LibraryItems of one type."""
+        return list(self.types.get(item_type, {}).get('items', {}).values())
+
+    def replace(self, item_type, items):
+        """Replaces all items of one type with Items API dicts, e.g. after a full fetch.
+
+        The old items stay in place until `items` has been fully consumed, so
+        a fetch that fails partway leaves the snapshot as it was.
+        """
+        entry = {'refreshed': self.last_refreshed(item_type), 'items': {}}
+        for item in items:
+            self._add(entry, item)
+        self.types[item_type] = entry
+
+    def update(self, item_type, changed_items, current_ids):
+        """Applies changed Items API dicts and drops any Id not in current_ids.
+
+        Returns (updated, removed) counts.
+        """
+        entry = self._entry(item_type)
+        updated = 0
+        for item in changed_items:
+            entry['items'].pop(item['Id'], None)
+            self._add(entry, item)
+            updated += 1
+        removed = [item_id for item_id in entry['items'] if item_id not in current_ids]
+        for item_id in removed:
+            del entry['items'][item_id]
+        return updated, len(removed)
+
+    def _entry(self, item_type):
+        return self.types.setdefault(item_type, {'refreshed': None, 'items': {}})
+
+    def _add(self, entry, item):
+        record = LibraryItem.from_api(item)
+        entry['items'][record.id] = record
@@ -0,0 +1,114 @@
+# #############################################################################
+# Description:  Link and image extraction for the scrapers, without building a
+#               document tree.
+#
+#               The scrapers only ever want the href of every <a> or the src
+#               of every <img>, so pages are run through a parser's start-tag
+#               events and just those attributes are kept. lxml's C parser is
+#               used when installed; otherwise the standard library's
+#               html.parser. link_extract_benchmark.py compares both against
+#               BeautifulSoup.
+#
+# #############################################################################
+
+import codecs
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+BACKENDS = ('lxml', 'html.parser')
+DEFAULT_BACKEND = 'lxml' if etree is not None else 'html.parser'
+# How far into a page a <meta charset> is looked for, as browsers do.
+CHARSET_SNIFF_BYTES = 1024
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([-\w.:]+)""", re.IGNORECASE)
+
+class _LxmlTarget:
+    """Parser target that keeps the wanted attribute of the wanted tags.
+
+    Without data() or end() methods lxml doesn't call back for text and end
+    tags at all, so only start tags reach Python.
+    """
+
+    def __init__(self, wanted):
+        self.wanted = wanted
+        self.found = []
+
+    def start(self, tag, attrib):
+        attribute = self.wanted.get(tag)
+        if attribute is not None:
+            value = attrib.get(attribute)
+            if value is not None:
+                self.found.append(value)
+
+    def close(self):
+        return self.found
+
+class _StartTagParser(HTMLParser):
+    def __init__(self, wanted):
+        super().__init__(convert_charrefs=True)
+        self.wanted = wanted
+        self.found = []
+
+    def handle_starttag(self, tag, attrs):
+        attribute = self.wanted.get(tag)
+        if attribute is not None:
+            for name, value in attrs:
+                if name == attribute:
+                    # A bare attribute (<a href>) counts as an empty value, as in BeautifulSoup
+                    self.found.append(value or '')
+                    break
+
+    handle_startendtag = handle_starttag
+
+def decode_html(content):
+    """Decodes a page body, going by its BOM or <meta charset>, then UTF-8, then Windows-1252."""
+    if isinstance(content, str):
+        return content
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if content.startswith(bom):
+            return content.decode(encoding, errors='replace')
+    match = _META_CHARSET.search(content, 0, CHARSET_SNIFF_BYTES)
+    if match:
+        try:
+            return content.decode(match.group(1).decode('ascii'), errors='replace')
+        except LookupError:
+            pass
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('windows-1252', errors='replace')
+
+def extract(content, wanted, backend=DEFAULT_BACKEND):
+    """Returns the values of the attributes in `wanted` ({tag: attribute}), in document order.
+
+    `content` is the page body as bytes or str. Tags without the attribute
+    are skipped; entities in the values are decoded.
+    """
+    if backend == 'lxml':
+        if etree is None:
+            raise ValueError("the lxml backend needs lxml installed")
+        if not content:
+            return []
+        parser = etree.HTMLParser(target=_LxmlTarget(wanted))
+        # Decoded here since lxml takes undeclared bytes for Latin-1 rather than trying UTF-8
+        parser.feed(decode_html(content))
+        return parser.close()
+    if backend == 'html.parser':
+        parser = _StartTagParser(wanted)
+        parser.feed(decode_html(content))
+        parser.close()
+        return parser.found
+    raise ValueError(f"unknown backend {backend!r}; choose from {', '.join(BACKENDS)}")
+
+def links(content, backend=DEFAULT_BACKEND):
+    """Returns the href of every <a> in a page."""
+    return extract(content, {'a': 'href'}, backend)
+
+def images(content, backend=DEFAULT_BACKEND):
+    """Returns the src of every <img> in a page."""
+    return extract(content, {'img': 'src'}, backend)
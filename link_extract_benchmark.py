@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# #############################################################################
+# Description:  Benchmarks link_extract against the BeautifulSoup path the
+#               scrapers used before (BeautifulSoup(content, "html.parser")
+#               then find_all('a', href=True)).
+#
+#               Runs on saved pages given on the command line, or on
+#               generated listing pages of the given sizes, checks every
+#               backend finds the same links as BeautifulSoup and reports
+#               MB/s and links/s for each.
+#
+# Usage:
+# python3 link_extract_benchmark.py --links 100,1000,10000
+# python3 link_extract_benchmark.py saved_page.html other_page.html
+#
+# #############################################################################
+
+import time
+from argparse import ArgumentParser
+
+from bs4 import BeautifulSoup
+
+import link_extract
+
+DEFAULT_LINKS = '100,1000,10000'
+
+def listing_page(link_count):
+    """A search-results style page: each result has a thumbnail, a title link, markup and text."""
+    rows = [
+        f'<div class="result"><a href="/video/{i}/clip-{i}.html" title="Clip &amp; {i}">'
+        f'<img src="//cdn.example.com/thumbs/{i}.jpg" alt="thumb"></a>'
+        f'<p class="meta">Added <span>{i % 28 + 1} days ago</span> &middot; {i * 7 % 600} views</p>'
+        f'<a href="/tags/tag-{i % 50}.html">tag {i % 50}</a></div>\n'
+        for i in range(link_count // 2)
+    ]
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Results</title>'
+        '<script>var tracker = "<a href=\'/not-a-link\'>";</script></head><body>\n'
+        + ''.join(rows) + '<!-- <a href="/commented-out"> --></body></html>'
+    ).encode('utf-8')
+
+def soup_links(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return [a['href'] for a in soup.find_all('a', href=True)]
+
+def timed(func, content, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = func(content)
+        best = min(best, time.perf_counter() - started)
+    return found, best
+
+def benchmark(name, content, repeat):
+    runs = [('BeautifulSoup', soup_links)]
+    for backend in link_extract.BACKENDS:
+        if backend != 'lxml' or link_extract.etree is not None:
+            runs.append((backend, lambda content, backend=backend: link_extract.links(content, backend)))
+    megabytes = len(content) / (1024 * 1024)
+    print(f"{name}: {megabytes:.2f} MB")
+    expected = None
+    baseline = None
+    for label, func in runs:
+        found, seconds = timed(func, content, repeat)
+        if expected is None:
+            expected, baseline = found, seconds
+        check = "same links" if found == expected else f"DIFFERENT LINKS ({len(found)} vs {len(expected)})"
+        print(f"  {label:<14} {seconds * 1000:9.1f} ms  {megabytes / seconds:7.1f} MB/s  "
+              f"{len(found) / seconds:11,.0f} links/s  {baseline / seconds:5.1f}x  {check}")
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmarks link_extract backends against BeautifulSoup.")
+    parser.add_argument('pages', nargs='*', help="Saved HTML pages to run on instead of generated ones")
+    parser.add_argument('--links', default=DEFAULT_LINKS,
+                        help=f"Comma separated link counts for generated pages (default: {DEFAULT_LINKS})")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per backend; the best is reported")
+    args = parser.parse_args()
+
+    if args.pages:
+        for path in args.pages:
+            with open(path, 'rb') as f:
+                benchmark(path, f.read(), args.repeat)
+    else:
+        for link_count in (int(count) for count in args.links.split(',')):
+            benchmark(f"{link_count} links", listing_page(link_count), args.repeat)
@@ -0,0 +1,122 @@
+# #############################################################################
+# Description:  ffprobe/mediainfo helpers for the Jellyfin scripts, with a
+#               persistent SQLite cache so unchanged files are never probed
+#               twice.
+#
+# #############################################################################
+
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlite_cache import SqliteCache, stat_or_none
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pympv", "probe_cache.sqlite")
+# Upper bound on cached probe results; the least recently used are evicted first.
+DEFAULT_MAX_ENTRIES = 200000
+# Concurrent stat/probe calls. Probing is almost all subprocess and disk wait,
+# so this should be sized to what the storage can serve, not to the CPU count.
+DEFAULT_PROBE_WORKERS = 8
+
+def probe_format(path):
+    """Returns the container format of a media file using ffprobe, or mediainfo if that fails."""
+    media_info = "Unknown"
+    try:
+        # Try ffprobe first
+        ffprobe_cmd = [
+            "ffprobe", "-v", "error", "-show_entries",
+            "format=format_name", "-of", "default=noprint_wrappers=1:nokey=1", path
+        ]
+        result = subprocess.run(ffprobe_cmd, capture_output=True, text=True)
+        if result.returncode == 0 and result.stdout.strip():
+            media_info = result.stdout.strip()
+        else:
+            # Try mediainfo if ffprobe fails
+            mediainfo_cmd = ["mediainfo", "--Inform=General;%Format%", path]
+            result = subprocess.run(mediainfo_cmd, capture_output=True, text=True)
+            if result.returncode == 0 and result.stdout.strip():
+                media_info = result.stdout.strip()
+    except Exception:
+        media_info = "Unknown"
+    return media_info
+
+class ProbeCache(SqliteCache):
+    """On-disk cache of probe results keyed on (path, st_size, st_mtime_ns).
+
+    A cached result is only returned while the file's size and mtime are
+    unchanged, so edited or replaced files are probed again. Once the cache
+    holds more than `max_entries` rows the least recently used are dropped.
+    """
+
+    table = 'probe'
+    key = 'path'
+    columns = ('size INTEGER NOT NULL', 'mtime_ns INTEGER NOT NULL', 'media_info TEXT NOT NULL')
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(db_path, max_entries)
+
+    def get(self, path, stat):
+        """Returns the cached result for `path` if its stat still matches, else None."""
+        row = self.conn.execute(
+            "SELECT media_info FROM probe WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row is None:
+            return None
+        self.touch(path)
+        return row[0]
+
+    def put(self, path, stat, media_info):
+        """Stores the probe result for `path` at its current size and mtime."""
+        self.write(
+            "INSERT OR REPLACE INTO probe (path, size, mtime_ns, media_info, last_used) VALUES (?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, media_info, time.time()),
+        )
+
+def probe_file(path, probe_cache=None):
+    """Stats and probes `path`, consulting `probe_cache` first.
+
+    Returns (stat, media_info); stat is None when the file can't be read.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, "Unknown"
+    if probe_cache is not None:
+        media_info = probe_cache.get(path, stat)
+        if media_info is not None:
+            return stat, media_info
+    media_info = probe_format(path)
+    # Failed probes aren't cached so a missing tool or flaky mount doesn't stick.
+    if probe_cache is not None and media_info != "Unknown":
+        probe_cache.put(path, stat, media_info)
+    return stat, media_info
+
+def probe_files(paths, probe_cache=None, workers=DEFAULT_PROBE_WORKERS):
+    """Stats and probes many files concurrently on a pool of `workers` threads.
+
+    Returns a dict of path -> (stat, media_info) with the same values
+    probe_file would give. The cache is only touched from the calling thread.
+    """
+    paths = list(dict.fromkeys(path for path in paths if path))
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        stats = dict(zip(paths, executor.map(stat_or_none, paths)))
+        to_probe = []
+        for path, stat in stats.items():
+            media_info = None
+            if stat is None:
+                media_info = "Unknown"
+            elif probe_cache is not None:
+                media_info = probe_cache.get(path, stat)
+            if media_info is None:
+                to_probe.append(path)
+            else:
+                results[path] = (stat, media_info)
+
+        for path, media_info in zip(to_probe, executor.map(probe_format, to_probe)):
+            stat = stats[path]
+            if probe_cache is not None and media_info != "Unknown":
+                probe_cache.put(path, stat, media_info)
+            results[path] = (stat, media_info)
+    return results
@@ -0,0 +1,156 @@
+# #############################################################################
+# Description:  Local state for jellyfin-watched-migrator.py, so repeated runs
+#               only move what changed since the last sync and interrupted
+#               runs can pick up where they stopped.
+#
+# #############################################################################
+
+import datetime
+import json
+import os
+
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pympv", "watched_sync_state.json")
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pympv", "watched_sync_journal.jsonl")
+STATE_VERSION = 1
+# Journal records written between flushes.
+JOURNAL_FLUSH_EVERY = 200
+# Delta runs ask for items played a little before the last sync started, so
+# clock skew between us and the source server can't make us miss one.
+SYNC_OVERLAP = datetime.timedelta(minutes=10)
+
+def sync_keys(item):
+    """Returns the keys identifying a watched item across servers.
+
+    One key per provider id, so an item counts as synced if any of its ids
+    was synced before. Items (LibraryItem records) without provider ids fall
+    back to their name.
+    """
+    keys = [f"{item.type}:{prov_key}:{prov_id}" for prov_key, prov_id in item.providers]
+    return keys or [f"{item.type}:Name:{item.name}"]
+
+class SyncCheckpoint:
+    """When the last sync started, which items it has already synced, and the
+    source ids of items it couldn't sync yet (`pending_ids`), which the next
+    run fetches again.
+
+    The checkpoint belongs to one source server, destination server and user;
+    state saved for any other combination is ignored.
+    """
+
+    def __init__(self, path, source, destination, username):
+        self.path = path
+        self.scope = {'source': source, 'destination': destination, 'username': username}
+        self.last_sync = None
+        self.synced_keys = set()
+        self.pending_ids = set()
+
+    def load(self):
+        """Reads the checkpoint from disk if there is one for this scope."""
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return self
+        if data.get('version') != STATE_VERSION or data.get('scope') != self.scope:
+            return self
+        self.last_sync = data.get('last_sync')
+        self.synced_keys = set(data.get('synced_keys', []))
+        self.pending_ids = set(data.get('pending_ids', []))
+        return self
+
+    def save(self):
+        """Writes the checkpoint atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = {
+            'version': STATE_VERSION,
+            'scope': self.scope,
+            'last_sync': self.last_sync,
+            'synced_keys': sorted(self.synced_keys),
+            'pending_ids': sorted(self.pending_ids),
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            json.dump(data, fp, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+    def is_synced(self, item):
+        return any(key in self.synced_keys for key in sync_keys(item))
+
+    def mark_synced(self, item):
+        self.synced_keys.update(sync_keys(item))
+
+    def set_pending(self, items):
+        """Records which of `items` (source LibraryItems) are still unsynced, replacing the old list."""
+        self.pending_ids = {item.id for item in items if not self.is_synced(item)}
+
+class ProgressJournal:
+    """Append-only JSONL journal of destination items marked during a run.
+
+    Entries are buffered and flushed (and fsynced) every `flush_every`
+    records, so journaling costs one small write per batch rather than per
+    POST. A run that dies loses at most the last unflushed batch, which a
+    resumed run simply marks again.
+    """
+
+    def __init__(self, path, destination, username, flush_every=JOURNAL_FLUSH_EVERY):
+        self.path = path
+        self.scope = {'destination': destination, 'username': username}
+        self.flush_every = flush_every
+        self.done_ids = set()
+        self.unflushed = 0
+        self.fp = None
+
+    def open(self, resume=False):
+        """Opens the journal, reading what an earlier run completed if `resume` is set."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if resume:
+            self.done_ids = self._read()
+        if resume and self.done_ids:
+            self.fp = open(self.path, 'a')
+            # Terminate any line torn by the crash before appending to it
+            self.fp.write('\n')
+        else:
+            self.fp = open(self.path, 'w')
+            self.fp.write(json.dumps({'scope': self.scope}) + '\n')
+        return self
+
+    def _read(self):
+        done_ids = set()
+        try:
+            with open(self.path) as fp:
+                header = json.loads(fp.readline() or '{}')
+                if header.get('scope') != self.scope:
+                    return done_ids
+                for line in fp:
+                    if not line.strip():
+                        continue
+                    try:
+                        done_ids.add(json.loads(line)['id'])
+                    except (ValueError, KeyError):
+                        # A line torn by a crash; skip it and keep reading
+                        continue
+        except (OSError, ValueError):
+            pass
+        return done_ids
+
+    def record(self, item_id):
+        self.done_ids.add(item_id)
+        self.fp.write(json.dumps({'id': item_id}) + '\n')
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        self.unflushed = 0
+
+    def close(self, finished=False):
+        """Flushes and closes the journal, deleting it once a run has finished cleanly."""
+        if self.fp is None:
+            return
+        self.flush()
+        self.fp.close()
+        self.fp = None
+        if finished:
+            os.remove(self.path)
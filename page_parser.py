@@ -2,16 +2,18 @@
 import sys
 import os
 import tempfile
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
-import yt_dlp
 import mpv
 import shutil
 from pathlib import Path
 import signal
 import time
 import readchar
+from crawler import crawl
+from http_cache import cache_from_environment
+from link_extract import links
+from concurrent.futures import ThreadPoolExecutor
+from download_queue import DownloadQueue, prefetched
 
 def handler(signum, frame):
     msg = "Ctrl-c was pressed. Do you really want to exit? y/n "
@@ -30,6 +32,10 @@ signal.signal(signal.SIGINT, handler)
 
 OUTPUT_DIR = '/tmp/'
 OUTPUT_FILENAME = OUTPUT_DIR + 'get.sh'
+DOWNLOAD_WORKERS = 4
+DOWNLOADS_PER_HOST = 2
+# Clips downloaded ahead of the one being reviewed
+PREFETCH_CLIPS = 4
 
 if os.path.isfile(OUTPUT_FILENAME):
     TF = tempfile.NamedTemporaryFile()
@@ -75,8 +81,9 @@ else:
     URL = sys.argv[2]
     SEARCH_STRING = sys.argv[1]
 
-page = requests.get(URL)
-soup = BeautifulSoup(page.content, "html.parser")
+def parse_search_page(page):
+    """Returns the links on the search page that mention SEARCH_STRING."""
+    return [], [href for href in links(page.content) if SEARCH_STRING in href]
 
     
 
@@ -111,85 +118,134 @@ def parse_identifier(FULL_PATH):
     return YTDL_COMMAND , VIDEO_NAME, VIDEO_URL
 
 
+# One mpv instance reviews every clip; idle keeps it alive between files
+PLAYER = None
+# Keep/discard decisions (moves can cross filesystems) run here, off the review loop
+DECISIONS = ThreadPoolExecutor(max_workers=1)
+
+def get_player():
+    global PLAYER
+    if PLAYER is not None and PLAYER.core_shutdown:
+        # Quit some way the bindings below don't cover; start afresh
+        PLAYER.terminate()
+        PLAYER = None
+    if PLAYER is None:
+        PLAYER = mpv.MPV(input_default_bindings=True, input_vo_keyboard=True, osc=True, idle=True)
+        PLAYER.volume = 20
+        # PLAYER.screen = 1
+        PLAYER.fullscreen = True
+        # q and closing the window would quit mpv altogether; here they just end the clip
+        for key in ('q', 'Q', 'CLOSE_WIN'):
+            PLAYER.keybind(key, 'stop')
+    return PLAYER
+
+def keep_video(OUTPUT_TEMPFILE, VIDEO_PATH):
+    shutil.move(OUTPUT_TEMPFILE, VIDEO_PATH)
+    print(f"{VIDEO_PATH} successfully downloaded and copied")
+
+def decision_failed(future):
+    if future.exception() is not None:
+        print(f"Could not apply decision: {future.exception()}")
+
 def play_accept_cleanup(OUTPUT_TEMPFILE, VIDEO_PATH):
-    player = mpv.MPV(input_default_bindings=True, input_vo_keyboard=True, osc=True)
-    player.volume = 20
-    # player.screen = 1
-    player.fullscreen = True
-    player.play(OUTPUT_TEMPFILE)
-    player.wait_for_playback()
+    player = get_player()
+    # Feed the clip through the playlist of the running player rather than starting a new one
+    try:
+        player.playlist_clear()
+        player.loadfile(OUTPUT_TEMPFILE, 'append-play')
+        player.wait_for_playback()
+    except mpv.ShutdownError:
+        # The player was shut down mid-clip; get_player() makes a new one for the next
+        print("Player closed")
     answer = input(f"Keep {OUTPUT_TEMPFILE} video file as {VIDEO_PATH} ? ([yes]/no or eXit)")
     # Remove white spaces after the answers and convert the characters into lower cases.
     answer = answer.strip().lower()
     
     if answer in ["yes", "y", "1", ""]:
-        shutil.move(OUTPUT_TEMPFILE, VIDEO_PATH)
-        print(f"{VIDEO_PATH} successfully downloaded and copied")
+        DECISIONS.submit(keep_video, OUTPUT_TEMPFILE, VIDEO_PATH).add_done_callback(decision_failed)
     elif answer in ["no", "n", "0"]:
         print('You answered no.') # or do something else
-        os.remove(OUTPUT_TEMPFILE)
+        DECISIONS.submit(os.remove, OUTPUT_TEMPFILE).add_done_callback(decision_failed)
     elif answer in ["e", "E", "x", "X"]:
+        # Let the decisions already made finish; downloads not yet reviewed are dropped
+        DECISIONS.shutdown(wait=True)
+        DOWNLOADS.close(cancel=True)
+        discard_unreviewed()
         sys.exit(1)
     else:
         print(f"Your answer can only be yes/y/1 or no/n/0. You answered {answer}")
 
 
+# Downloads run ahead of the review, at most PREFETCH_CLIPS at a time
+DOWNLOADS = DownloadQueue(workers=DOWNLOAD_WORKERS, per_host=DOWNLOADS_PER_HOST)
+# (VIDEO_URL, temporary file, (VIDEO_NAME, VIDEO_PATH)) for every clip to review
+DOWNLOAD_JOBS = []
+# Temporary files of the clips handed over for review so far
+REVIEWED = set()
+
+def discard_unreviewed():
+    # Clips prefetched but never shown would otherwise be left in the temp directory
+    for _, OUTPUT_TEMPFILE, _ in DOWNLOAD_JOBS:
+        if OUTPUT_TEMPFILE in REVIEWED:
+            continue
+        for path in (OUTPUT_TEMPFILE, OUTPUT_TEMPFILE + '.part'):
+            if os.path.isfile(path):
+                os.remove(path)
+
 def download_video(VIDEO_URL,VIDEO_NAME, VIDEO_PATH):
-    TF = tempfile.NamedTemporaryFile()
-    OUTPUT_TEMPFILE = TF.name
+    FD, OUTPUT_TEMPFILE = tempfile.mkstemp()
+    os.close(FD)
 
     # yt-dlp will create the output file and fail if it exists already... workaround is to delete temporary
 
     os.remove(OUTPUT_TEMPFILE)
 
-    ydl_options = {
-         'outtmpl': OUTPUT_TEMPFILE,
-    }
-
-    ydl = yt_dlp.YoutubeDL(ydl_options)
-
-    try:
-        ydl.download(VIDEO_URL)
-    except KeyboardInterrupt:
-        return
-    except:
-        print(f"Call to ytdl with {VIDEO_URL} failed")
-        return
-
-
     print(f"{VIDEO_URL} will be downloaded")
-
-
-    if os.path.isfile(OUTPUT_TEMPFILE):
-         print(f"{VIDEO_NAME}  successfully downloaded")
-         play_accept_cleanup(OUTPUT_TEMPFILE,VIDEO_PATH)
+    DOWNLOAD_JOBS.append((VIDEO_URL, OUTPUT_TEMPFILE, (VIDEO_NAME, VIDEO_PATH)))
+
+def review_downloads():
+    # While one clip is being reviewed, the next PREFETCH_CLIPS are downloading or waiting
+    for result, (VIDEO_NAME, VIDEO_PATH) in prefetched(DOWNLOADS, DOWNLOAD_JOBS, PREFETCH_CLIPS):
+        REVIEWED.add(result.filename)
+        if result.error:
+            print(f"Call to ytdl with {result.url} failed: {result.error}")
+            print(f"{VIDEO_PATH} failed to download")
+        else:
+            print(f"{VIDEO_NAME}  successfully downloaded")
+            play_accept_cleanup(result.filename, VIDEO_PATH)
+    DOWNLOADS.close()
+    DECISIONS.shutdown(wait=True)
+
+
+
+# Search pages are cached on disk (see http_cache.py), so re-running a search doesn't download them again
+HTTP_CACHE = cache_from_environment()
+SEARCH_RESULTS = crawl([URL], parse_search_page, max_depth=0, cache=HTTP_CACHE)
+if HTTP_CACHE is not None:
+    HTTP_CACHE.close()
+
+for THIS_HREF in SEARCH_RESULTS:
+    THIS_YTDL, VIDEO_NAME, VIDEO_URL = parse_identifier(THIS_HREF)
+    VIDEO_PATH = TARGET_DIR + VIDEO_NAME + ".mp4"
+    if FILE_MODE == True:
+        play_accept_cleanup(sys.argv[1], VIDEO_PATH)
+        # answer = input(f"Keep {sys.argv[1]} video file as {VIDEO_PATH} ? (yes/no)")
+        # # Remove white spaces after the answers and convert the characters into lower cases.
+        # answer = answer.strip().lower()
+        # if answer in ["yes", "y", "1", ""]:
+        #     shutil.move(sys.argv[1], VIDEO_PATH)
+        #     print(f"{VIDEO_PATH} successfully Moved to video directory")
     else:
-        print(f"{VIDEO_PATH} failed to download")
-
-
-
-for a in soup.find_all('a', href=True):
-    THIS_HREF = a['href']
-    if SEARCH_STRING in THIS_HREF:
-        THIS_YTDL, VIDEO_NAME, VIDEO_URL = parse_identifier(THIS_HREF)
-        VIDEO_PATH = TARGET_DIR + VIDEO_NAME + ".mp4"
-        if FILE_MODE == True:
-            play_accept_cleanup(sys.argv[1], VIDEO_PATH)
-            # answer = input(f"Keep {sys.argv[1]} video file as {VIDEO_PATH} ? (yes/no)")
-            # # Remove white spaces after the answers and convert the characters into lower cases.
-            # answer = answer.strip().lower()
-            # if answer in ["yes", "y", "1", ""]:
-            #     shutil.move(sys.argv[1], VIDEO_PATH)
-            #     print(f"{VIDEO_PATH} successfully Moved to video directory")
+        FILE_MODE = False
+        if os.path.isfile(VIDEO_PATH):
+            print(f"{VIDEO_PATH} already exists")
         else:
-            FILE_MODE = False
-            if os.path.isfile(VIDEO_PATH):
-                print(f"{VIDEO_PATH} already exists")
-            else:
-                #print(f"yt-dlp {THIS_URL} -o /tmp/blood/")
-                FILE_HANDLE = open(OUTPUT_FILENAME, 'a')
-                FILE_HANDLE.write(THIS_YTDL +"\n")
-                download_video(VIDEO_URL, VIDEO_NAME, VIDEO_PATH)
+            #print(f"yt-dlp {THIS_URL} -o /tmp/blood/")
+            FILE_HANDLE = open(OUTPUT_FILENAME, 'a')
+            FILE_HANDLE.write(THIS_YTDL +"\n")
+            download_video(VIDEO_URL, VIDEO_NAME, VIDEO_PATH)
+
+review_downloads()
 
 try:
     FILE_HANDLE.close()
@@ -1,17 +1,34 @@
 #!/usr/bin/env python3
 
 # This script takes a URL and downloads all the images from the site
+# Usage: site_images.py URL [link depth, default 1] [max pages, default 100]
 import sys
 import os
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
-import shutil
+import asyncio
+from urllib.parse import urljoin, urlparse
+from crawler import Crawler
+from http_cache import cache_from_environment
+from image_download import ImageDownloader
+from image_store import ImageStore
+import link_extract
 
 if len(sys.argv) < 2:
     print ('Need to specify a URL')
     sys.exit(1)
 
+# Images downloaded at once; set IMAGE_WORKERS to change it
+DOWNLOAD_WORKERS = int(os.environ.get('IMAGE_WORKERS', 8))
+# Set IMAGE_STORE to a directory to keep each distinct image once there, by
+# content, with the files here as links to it (see image_store.py)
+IMAGE_STORE = os.environ.get('IMAGE_STORE')
+# Pages are fetched a few at a time and at least PAGE_DELAY seconds apart,
+# longer if the site's robots.txt asks for it
+PAGE_WORKERS = 4
+PAGE_DELAY = 0.5
+# Links to these are never pages, so they aren't fetched to look for images
+NOT_PAGES = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp', '.pdf', '.zip',
+             '.mp4', '.webm', '.mp3', '.css', '.js')
+
 # debug function - when environment variable DEBUG is set to 1, print the contents of params
 def debug_write(params):
     if os.environ.get('DEBUG') == '1':
@@ -19,41 +36,79 @@ def debug_write(params):
 
 
 URL = sys.argv[1]
+MAX_DEPTH = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+MAX_PAGES = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+SITE = urlparse(URL).netloc.lower()
 debug_write(URL)
 
-page = requests.get(URL)
-
-debug_write(page)
-soup = BeautifulSoup(page.content, "html.parser")
-debug_write(soup)
-
-
 
-def get_images(soup):
+def get_images(page):
     images = []
-    for img in soup.find_all('img'):
-        images.append(img.get('src'))
+    for image in link_extract.images(page.content):
+        # src is often relative to the page
+        image = urljoin(page.url, image)
+        if urlparse(image).scheme in ('http', 'https'):
+            images.append(image)
+        else:
+            debug_write(f"Skipping {image[:80]}")
     return images
 
+def get_pages(page):
+    pages = []
+    for link in link_extract.links(page.content):
+        link = urljoin(page.url, link)
+        parts = urlparse(link)
+        if parts.netloc.lower() == SITE and not parts.path.lower().endswith(NOT_PAGES):
+            pages.append(link)
+    return pages
 
+def parse_page(page):
+    debug_write(f"{page.url} (depth {page.depth})")
+    return get_pages(page), get_images(page)
 
-def download_images(images):
+
+# Files already here are skipped and partial ones resumed (see image_download.py)
+IMAGE_JOBS = []
+FILENAMES = set()
+
+def download_images(images, downloader):
     for image in images:
-        try:
-            response = requests.get(image, stream=True)
-            filename = os.path.basename(urlparse(image).path)
-            with open(filename, 'wb') as out_file:
-                shutil.copyfileobj(response.raw, out_file)
-            del response
-        except Exception as e:
-            print(f"Failed to download {image}: {e}")
+        filename = os.path.basename(urlparse(image).path)
+        # The same image is often on several pages, under the same name. The
+        # store tells images apart by content, so it gets every URL.
+        if not filename or (IMAGE_STORE is None and filename in FILENAMES):
+            continue
+        FILENAMES.add(filename)
+        IMAGE_JOBS.append(downloader.submit(image, filename))
 
 # This function takes the base page on a site and walks through the subsequent pages
 # Calling get_images and download_images on each page
+def walk_site(url):
+    # Pages are cached on disk (see http_cache.py); images are always checked against the server
+    http_cache = cache_from_environment()
+    store = ImageStore(IMAGE_STORE) if IMAGE_STORE else None
+    with ImageDownloader(workers=DOWNLOAD_WORKERS, store=store) as downloader:
+        # Images are queued as each page is parsed, so they download while the crawl goes on
+        crawler = Crawler(parse_page, workers=PAGE_WORKERS, per_host=PAGE_WORKERS, max_depth=MAX_DEPTH,
+                          max_pages=MAX_PAGES, on_found=lambda image: download_images([image], downloader),
+                          cache=http_cache, robots=True, delay=PAGE_DELAY)
+        try:
+            images = asyncio.run(crawler.crawl([url]))
+        finally:
+            if http_cache is not None:
+                http_cache.close()
+        print(f"{len(crawler.seen)} pages found, {crawler.disallowed} disallowed by robots.txt, "
+              f"{crawler.dropped} over the page limit: {len(images)} images found")
+        for future in IMAGE_JOBS:
+            result = future.result()
+            debug_write(result)
+            if result.error:
+                print(f"Failed to download {result.url}: {result.error}")
+    if store is not None:
+        print(f"{store.added} new images stored, {store.duplicates} already in {IMAGE_STORE}")
+        store.close()
 
 
 # call get_images and download_images on the URL specified - log the steps using the debug_write function
-images = get_images(soup)
-debug_write(images)
-download_images(images)
+walk_site(URL)
 debug_write('done')
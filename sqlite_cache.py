@@ -0,0 +1,90 @@
+# #############################################################################
+# Description:  The SQLite plumbing shared by the on-disk caches (probe
+#               results, content hashes, HTTP responses): one table per
+#               cache with a last_used column, commits in small batches, and
+#               least recently used eviction when the cache is closed.
+#
+# #############################################################################
+
+import os
+import sqlite3
+import time
+
+# Number of new rows written between commits.
+COMMIT_BATCH_SIZE = 50
+
+def stat_or_none(path):
+    """os.stat(), or None if the file can't be read."""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+class SqliteCache:
+    """One SQLite table of cached rows, trimmed to the most recently used.
+
+    Subclasses name the `table`, its primary `key` column and the other
+    `columns` (SQL column definitions); a last_used column is added after
+    them. write() runs a statement and commits every `commit_batch_size`
+    writes, so an interrupted run keeps most of its work. Once the table
+    holds more than `max_entries` rows (None: no cap) the least recently
+    used are dropped; subclasses can override evict() to cap something else.
+    """
+
+    table = None
+    key = None
+    columns = ()
+    commit_batch_size = COMMIT_BATCH_SIZE
+
+    def __init__(self, db_path, max_entries=None):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.max_entries = max_entries
+        self.pending_writes = 0
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f" {self.key} TEXT PRIMARY KEY,"
+            + ''.join(f" {column}," for column in self.columns) +
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table} (last_used)")
+        self.conn.commit()
+
+    def touch(self, key):
+        """Marks the row for `key` as just used."""
+        self.conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE {self.key} = ?", (time.time(), key))
+
+    def write(self, sql, params):
+        """Runs an INSERT or UPDATE, committing once a batch of them has built up."""
+        self.conn.execute(sql, params)
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_batch_size:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def clear(self):
+        """Drops every cached row."""
+        self.conn.execute(f"DELETE FROM {self.table}")
+        self.conn.commit()
+
+    def evict(self):
+        """Trims the cache down to `max_entries`, dropping the least recently used rows."""
+        if self.max_entries is None:
+            return
+        self.conn.execute(
+            f"DELETE FROM {self.table} WHERE {self.key} IN ("
+            f" SELECT {self.key} FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def close(self):
+        """Evicts, commits and closes the underlying database."""
+        self.evict()
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
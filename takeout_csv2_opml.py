@@ -12,82 +12,182 @@
 # python3 youtube-subs-to-opml.py '~/Downloads/Takeout/YouTube\ and\ YouTube\ Music/subscriptions/subscriptions.json'  > yt-subs.opml
 
 
-def json_parse(filename):
-    import json
-    from xml.sax.saxutils import escape
+# Several exports (e.g. one per account) can be given at once; they are merged
+# in one pass, keeping the first subscription seen for each channel, and
+# written out as they are read, so even very large exports convert in
+# constant memory apart from the set of channel ids seen.
+#
+# python3 youtube-subs-to-opml.py account1/subscriptions.csv account2/subscriptions.json -o yt-subs.opml
+#
+# With --check-feeds every channel's feed is fetched first (see feed_check.py)
+# and channels that are gone are marked feedStatus="dead", or left out with
+# --dead drop. Feeds are cached on disk and revalidated, so re-running costs
+# little more than a 304 per channel; set FEED_CACHE_PATH to move the cache.
 
-    channels = []
+# Bytes read from a JSON export at a time.
+JSON_READ_SIZE = 64 * 1024
+# Output buffer for the OPML file.
+WRITE_BUFFER_BYTES = 1024 * 1024
 
-    with open(filename, "r+") as fp:
-        subs = json.load(fp.read())
-        for sub in subs:
-            channels.append(
-                (
-                    escape(sub["snippet"]["title"]),
-                    escape(sub["snippet"]["resourceId"]["channelId"]),
-                )
-            )
 
-    return channels
+def json_parse(filename):
+    """Yields (title, channel id) for each subscription in a Takeout JSON export.
+
+    The export is one big array, so its entries are decoded one at a time
+    with raw_decode() from a buffer topped up as it runs low, instead of
+    loading the whole document.
+    """
+    import json
+
+    decoder = json.JSONDecoder()
+    with open(filename, "r", encoding="utf-8-sig") as fp:
+        buffer = fp.read(JSON_READ_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{filename}: expected a JSON array of subscriptions")
+        position = 1
+        eof = False
+        while True:
+            # Skip the whitespace and comma between entries
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                sub, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The entry runs past the end of the buffer; read on and retry
+                if eof:
+                    raise
+                more = fp.read(JSON_READ_SIZE)
+                eof = not more
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            position = end
+            yield sub["snippet"]["title"], sub["snippet"]["resourceId"]["channelId"]
 
 
 def csv_parse(filename):
+    """Yields (title, channel id) for each row of a Takeout CSV export."""
     import csv
-    from xml.sax.saxutils import escape
 
-    channels = []
-
-    with open(filename, "r+") as fp:
+    with open(filename, "r", encoding="utf-8-sig", newline="") as fp:
         reader = csv.reader(fp, delimiter=",", quotechar='"')
-        next(reader)
+        next(reader, None)
         for row in reader:
             if row:
-                channels.append((escape(row[2]), escape(row[0])))
+                yield row[2], row[0]
 
-    return channels
 
+PARSERS = {".csv": csv_parse, ".json": json_parse}
 
-if __name__ == "__main__":
-    from argparse import ArgumentParser
+
+def unique_channels(filenames):
+    """Yields (title, channel id) from every export in turn, each channel only once."""
     from os import path
 
-    parser = ArgumentParser(description="Generate youtube subscriptions OPML")
-    parser.add_argument("file", help="filename to parse")
-    args = parser.parse_args()
+    seen = set()
+    for filename in filenames:
+        parse = PARSERS[path.splitext(filename)[-1].lower()]
+        for title, channel_id in parse(filename):
+            if channel_id not in seen:
+                seen.add(channel_id)
+                yield title, channel_id
 
-    ext = path.splitext(args.file)[-1].lower()
 
-    if ext == ".csv":
-        channels = csv_parse(args.file)
-    elif ext == ".json":
-        channels = json_parse(args.file)
-    else:
-        print(f"Error, unknown extension in provided filename: {args.file}")
+class OpmlWriter:
+    """Writes the OPML document a channel at a time through one buffered handle."""
 
-    print(
-        f"""<?xml version="1.0" encoding="UTF-8"?>
+    def __init__(self, fp):
+        self.fp = fp
+        self.count = 0
+        self.fp.write(
+            """<?xml version="1.0" encoding="UTF-8"?>
 <opml version="1.0">
 <body>
     <outline title="YouTube" text="YouTube">
 """
-    )
-
-    for channel in channels:
-        print(
-            f"""        <outline title="{channel[0]}"
-            text="{channel[0]}"
-            xmlUrl="https://www.youtube.com/feeds/videos.xml?channel_id={channel[1]}"
-            htmlUrl="https://www.youtube.com/channel/{channel[1]}" />
+        )
+
+    def write_channel(self, title, channel_id, **attributes):
+        from xml.sax.saxutils import escape, quoteattr
+
+        title = quoteattr(title)
+        channel_id = escape(channel_id, {'"': "&quot;"})
+        extra = "".join(f"\n            {name}={quoteattr(str(value))}" for name, value in attributes.items())
+        self.fp.write(
+            f"""        <outline title={title}
+            text={title}
+            xmlUrl="https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+            htmlUrl="https://www.youtube.com/channel/{channel_id}"{extra} />
 """
         )
+        self.count += 1
 
-    print(
-        """
-    </outline>
+    def close(self):
+        self.fp.write(
+            """    </outline>
 </body>
 </opml>
 """
-    )
+        )
+        self.fp.flush()
+
+
+async def write_checked_channels(channels, writer, checker, feed_url, drop_dead):
+    """Writes `channels` as their feed checks finish, in order, annotating or dropping dead ones."""
+    async with checker:
+        async for (title, channel_id), result in checker.check_in_order(channels, lambda channel: feed_url + channel[1]):
+            if result.state == "ok":
+                writer.write_channel(title, channel_id)
+            elif not (drop_dead and result.state == "dead"):
+                writer.write_channel(title, channel_id, feedStatus=result.state, feedError=result.detail)
+
+
+if __name__ == "__main__":
+    import sys
+    from argparse import ArgumentParser
+    from os import path
+
+    parser = ArgumentParser(description="Generate youtube subscriptions OPML")
+    parser.add_argument("file", nargs="+", help="filenames to parse (.csv or .json)")
+    parser.add_argument("-o", "--output", help="write the OPML here instead of to stdout")
+    parser.add_argument("--check-feeds", action="store_true", help="fetch every channel feed and flag dead channels")
+    parser.add_argument("--dead", choices=("annotate", "drop"), default="annotate",
+                        help="what to do with dead channels when checking feeds (default: annotate)")
+    parser.add_argument("--feed-url", help="feed URL the channel id is appended to, e.g. a local stand-in")
+    parser.add_argument("--feed-concurrency", type=int, help="feeds fetched at once when checking")
+    parser.add_argument("--feed-ttl", type=float, default=0,
+                        help="seconds a cached feed counts as checked without asking again (default: always revalidate)")
+    args = parser.parse_args()
+
+    for filename in args.file:
+        if path.splitext(filename)[-1].lower() not in PARSERS:
+            parser.error(f"unknown extension in provided filename: {filename}")
+
+    if args.output:
+        out = open(args.output, "w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES)
+    else:
+        out = open(sys.stdout.fileno(), "w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES, closefd=False)
+    with out:
+        writer = OpmlWriter(out)
+        if args.check_feeds:
+            import asyncio
+            import os
+            from feed_check import DEFAULT_CACHE_PATH, DEFAULT_CONCURRENCY, FEED_URL, FeedChecker
+            from http_cache import HttpCache
+
+            with HttpCache(os.environ.get("FEED_CACHE_PATH", DEFAULT_CACHE_PATH), ttl=args.feed_ttl) as cache:
+                checker = FeedChecker(cache, concurrency=args.feed_concurrency or DEFAULT_CONCURRENCY)
+                asyncio.run(write_checked_channels(unique_channels(args.file), writer, checker,
+                                                   args.feed_url or FEED_URL, args.dead == "drop"))
+            print(f"Feeds: {checker.counts['ok']} ok ({checker.counts['revalidated']} unchanged), "
+                  f"{checker.counts['dead']} dead, {checker.counts['error']} could not be checked", file=sys.stderr)
+        else:
+            for title, channel_id in unique_channels(args.file):
+                writer.write_channel(title, channel_id)
+        writer.close()
+    print(f"{writer.count} channels", file=sys.stderr)
 
 
 # Open source under BSD-2-Clause
@@ -0,0 +1,181 @@
+# #############################################################################
+# Description:  Fuzzy title matching for the watched migrator, for items whose
+#               provider ids and exact names don't line up between servers.
+#
+#               Titles are normalized (case, accents, punctuation, a trailing
+#               "(year)") and indexed by word and character trigram, so a lookup
+#               only scores the handful of titles that share its rarest
+#               blocking keys rather than the whole library.
+#
+# #############################################################################
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+# Lowest similarity (0-1, difflib ratio of the normalized titles) accepted as a match.
+DEFAULT_THRESHOLD = 0.88
+# Blocking keys looked up per query, rarest first.
+BLOCKING_KEYS = 4
+# Keys shared by more titles than this say nothing about a match and are skipped.
+MAX_POSTINGS = 2000
+# Candidates scored per query, by number of blocking keys shared.
+MAX_CANDIDATES = 20
+# Titles with fewer words than this (articles aside) must have the same words
+# to match; longer ones may differ by one misspelt word.
+LONG_TITLE_WORDS = 4
+# How alike a misspelt word has to be to the one it stands for.
+WORD_SIMILARITY = 0.8
+ARTICLES = frozenset(('the', 'a', 'an', 'and'))
+
+# Only a bracketed year is split off; a bare one ("Blade Runner 2049") is part of the title
+_YEAR_SUFFIX = re.compile(r"\s*[\(\[]\s*((?:19|20)\d\d)\s*[\)\]]\s*$")
+_NON_WORD = re.compile(r"[^\w]+")
+# Roman numerals as used for sequels and parts (I to XXXIX)
+_ROMAN = re.compile(r"^(x{0,3})(ix|iv|v?i{0,3})$")
+_ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10}
+
+def normalize_title(title):
+    """Returns (words, year) for a title: lower case, no accents or punctuation, a trailing (year) split off."""
+    title = unicodedata.normalize('NFKD', title or '')
+    title = ''.join(char for char in title if not unicodedata.combining(char)).casefold()
+    year = None
+    match = _YEAR_SUFFIX.search(title)
+    if match and match.start() > 0:
+        year = int(match.group(1))
+        title = title[:match.start()]
+    title = title.replace('&', ' and ')
+    words = [word for word in _NON_WORD.split(title.replace('_', ' ')) if word]
+    if len(words) > 1 and words[0] in ('the', 'a', 'an'):
+        words = words[1:]
+    return words, year
+
+def _number(word):
+    """The value of a word that is a number (digits or a roman numeral), else None."""
+    if word.isdigit():
+        return int(word)
+    if word and _ROMAN.match(word):
+        values = [_ROMAN_VALUES[char] for char in word]
+        return sum(-value if value < following else value
+                   for value, following in zip(values, values[1:] + [0]))
+    return None
+
+def _words_agree(words, other_words):
+    """Whether two normalized titles name the same thing, however alike they look.
+
+    The numbers in them must be the same (so "Rocky II" never matches
+    "Rocky III", nor "Episode 10" "Episode 11"), and so must the other words,
+    articles aside: short titles exactly ("Alien" isn't "Aliens"), titles of
+    LONG_TITLE_WORDS or more words bar one misspelling.
+    """
+    if ''.join(words) == ''.join(other_words):
+        return True
+    numbers = sorted(n for n in map(_number, words) if n is not None)
+    other_numbers = sorted(n for n in map(_number, other_words) if n is not None)
+    if numbers != other_numbers:
+        return False
+    content = {word for word in words if word not in ARTICLES and _number(word) is None}
+    other_content = {word for word in other_words if word not in ARTICLES and _number(word) is None}
+    if content == other_content:
+        return True
+    missing, extra = content - other_content, other_content - content
+    if len(missing) != 1 or len(extra) != 1 or min(len(content), len(other_content)) < LONG_TITLE_WORDS:
+        return False
+    word, other_word = missing.pop(), extra.pop()
+    return SequenceMatcher(None, word, other_word, autojunk=False).ratio() >= WORD_SIMILARITY
+
+def _blocking_keys(words):
+    compact = ''.join(words)
+    keys = {'w:' + word for word in words}
+    keys.update(compact[i:i + 3] for i in range(len(compact) - 2))
+    return keys
+
+class TitleIndex:
+    """Normalized titles of the destination library, for fuzzy lookups.
+
+    Titles are scoped by item type and, for episodes, series, so an episode
+    only ever matches within its own show. Entries are (position, item id);
+    of equally good matches the lowest position wins, as with the exact
+    indexes in jellyfin-watched-migrator.py.
+
+    Most items match on provider ids, so added items are only indexed when
+    the first fuzzy lookup needs them.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.pending = []
+        self.titles = []
+        self.exact = {}
+        self.postings = {}
+
+    def add(self, item, entry):
+        self.pending.append((item, entry))
+
+    def _index_pending(self):
+        for item, entry in self.pending:
+            self._index(item, entry)
+        self.pending = []
+
+    def _index(self, item, entry):
+        words, year = normalize_title(item.name)
+        if not words:
+            return
+        # The item's own year is more reliable than one in its name
+        year = item.year or year
+        scope = _scope(item)
+        index = len(self.titles)
+        self.titles.append((' '.join(words), tuple(words), year, entry))
+        self.exact.setdefault((scope, ''.join(words)), index)
+        for key in _blocking_keys(words):
+            self.postings.setdefault((scope, key), []).append(index)
+
+    def match(self, item):
+        """Returns the (position, item id) entry best matching `item`'s title, or None."""
+        if self.pending:
+            self._index_pending()
+        words, year = normalize_title(item.name)
+        if not words:
+            return None
+        # The item's own year is more reliable than one in its name
+        year = item.year or year
+        scope = _scope(item)
+        exact = self.exact.get((scope, ''.join(words)))
+        if exact is not None and _years_agree(year, self.titles[exact][2]):
+            return self.titles[exact][3]
+
+        # Only the rarest keys are looked up, so common words and trigrams
+        # never pull in thousands of candidates.
+        postings = [self.postings.get((scope, key), ()) for key in _blocking_keys(words)]
+        postings = sorted((found for found in postings if 0 < len(found) <= MAX_POSTINGS), key=len)
+        shared = {}
+        for found in postings[:BLOCKING_KEYS]:
+            for index in found:
+                shared[index] = shared.get(index, 0) + 1
+        candidates = sorted(shared, key=lambda index: (-shared[index], index))[:MAX_CANDIDATES]
+
+        title = ' '.join(words)
+        matcher = SequenceMatcher(None, b=title, autojunk=False)
+        best = None
+        for index in candidates:
+            candidate, candidate_words, candidate_year, entry = self.titles[index]
+            if not _years_agree(year, candidate_year):
+                continue
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < self.threshold or matcher.quick_ratio() < self.threshold:
+                continue
+            score = matcher.ratio()
+            # The ratio alone can't tell a sequel or the next episode from a typo
+            if score >= self.threshold and (best is None or (-score, entry) < best) \
+                    and _words_agree(words, candidate_words):
+                best = (-score, entry)
+        return best[1] if best else None
+
+def _scope(item):
+    if item.type == 'Episode':
+        return item.type, ' '.join(normalize_title(item.series)[0])
+    return item.type
+
+def _years_agree(year, other_year):
+    """Years only rule a match out when both titles carry one and they're over a year apart."""
+    return year is None or other_year is None or abs(year - other_year) <= 1
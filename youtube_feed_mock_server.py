@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# #############################################################################
+# Description:  A local stand-in for YouTube's channel feeds, so the feed check
+#               in takeout_csv2_opml.py can be run and timed without hitting
+#               youtube.com.
+#
+#               Serves /feeds/videos.xml?channel_id=... as a small Atom feed
+#               with an ETag and Last-Modified, answering conditional GETs
+#               with 304. Every `dead_every`-th channel (by a hash of its id)
+#               is a 404. GET /_stats returns response counts per status.
+#
+# Usage:
+# python3 youtube_feed_mock_server.py --port 8097 --latency 0.05
+# then run takeout_csv2_opml.py --check-feeds --feed-url http://127.0.0.1:8097/feeds/videos.xml?channel_id=
+#
+# #############################################################################
+
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+def is_dead(channel_id, dead_every):
+    return dead_every > 0 and zlib.crc32(channel_id.encode()) % dead_every == 0
+
+def feed_for(channel_id):
+    entries = ''.join(
+        f"<entry><id>yt:video:{channel_id}{n}</id><title>Video {n}</title></entry>" for n in range(15)
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+            f'<title>Channel {channel_id}</title>{entries}</feed>').encode()
+
+class MockFeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == '/_stats':
+            return self._send(200, json.dumps(server.stats()).encode(), {'Content-Type': 'application/json'})
+        if server.latency:
+            time.sleep(server.latency)
+        channel_id = parse_qs(url.query).get('channel_id', [''])[-1]
+        if url.path != '/feeds/videos.xml' or not channel_id or is_dead(channel_id, server.dead_every):
+            return self._send(404, b'Not found', {'Content-Type': 'text/plain'})
+        etag = f'"{zlib.crc32(channel_id.encode()):08x}"'
+        headers = {'ETag': etag, 'Last-Modified': LAST_MODIFIED}
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, b'', headers)
+        headers['Content-Type'] = 'application/atom+xml; charset=UTF-8'
+        self._send(200, feed_for(channel_id), headers)
+
+    def _send(self, status, body, headers):
+        self.server.count_response(status)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MockFeedServer(ThreadingHTTPServer):
+    """The HTTP server; response counts per status are kept in `response_counts`."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, dead_every=10, latency=0.0):
+        super().__init__(address, MockFeedHandler)
+        self.dead_every = dead_every
+        self.latency = latency
+        self.response_counts = Counter()
+        self.counts_lock = threading.Lock()
+
+    @property
+    def feed_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/feeds/videos.xml?channel_id="
+
+    def count_response(self, status):
+        with self.counts_lock:
+            self.response_counts[status] += 1
+
+    def stats(self):
+        with self.counts_lock:
+            return dict(self.response_counts)
+
+def start_mock_server(port=0, dead_every=10, latency=0.0):
+    """Starts a mock server on a background thread and returns it; call shutdown() to stop."""
+    server = MockFeedServer(('127.0.0.1', port), dead_every, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Serve stand-in YouTube channel feeds for testing")
+    parser.add_argument("--port", type=int, default=8097, help="port to listen on")
+    parser.add_argument("--dead-every", type=int, default=10, help="make roughly one in N channels a 404 (0: none)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every feed response")
+    args = parser.parse_args()
+
+    server = MockFeedServer(('127.0.0.1', args.port), args.dead_every, args.latency)
+    print(f"Serving feeds at {server.feed_url}<channel id>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass